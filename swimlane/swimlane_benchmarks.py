@@ -0,0 +1,442 @@
+import argparse, gc, json, math, os, platform, random, shutil, subprocess, sys, tempfile, time, tracemalloc
+from datetime import datetime
+
+import swimlane_tools
+from swimlane_tools import (SwimlaneBuildTool, SwimlaneLazyModule, build_json_nodes, build_json_nodes_for_notebook, calculate_label_positions,
+                            get_layout_inputs, get_swimlane_file_names, load_swimlane_files, set_colors_and_initial_node_positions,
+                            set_final_node_and_label_positions, set_positions, find_backward_edges, SwimlaneReachabilityIndex)
+
+# Benchmarks for how SwimlaneBuildTool scales.  Synthetic documentation directories are generated for each size and
+# every stage of the build is timed on its own.  Results are written as json so that two runs can be compared:
+#     python swimlane_benchmarks.py --sizes 100 1000 10000 --output before.json
+#     python swimlane_benchmarks.py --sizes 100 1000 10000 --output after.json --compare before.json
+
+default_sizes = [100, 1000, 10000, 100000]
+default_freq_mix = {'s': 0.1, 'd': 0.4, 'w': 0.3, 'u': 0.2}
+default_import_repeat = 5
+# Modules that importing swimlane_tools shouldn't load since they're only imported when they're first used
+deferred_modules = ['networkx', 'numpy', 'orjson', 'matplotlib', 'scipy', 'multiprocessing']
+
+import_script = '''
+import json, sys, time
+sys.path.insert(0, {directory!r})
+start = time.perf_counter()
+import swimlane_tools
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded_modules': [name for name in {deferred_modules!r} if name in sys.modules]}}))
+'''
+
+# Imports swimlane_tools in a new interpreter repeat times (so nothing is already imported).  Returns the fastest and
+# median seconds along with any of the deferred modules that the import loaded, which should be none.
+def measure_import_time(repeat=default_import_repeat):
+    script = import_script.format(directory=os.path.dirname(os.path.abspath(__file__)), deferred_modules=deferred_modules)
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+        runs.append(json.loads(completed.stdout))
+    seconds = sorted(run['seconds'] for run in runs)
+    loaded_modules = sorted(set(name for run in runs for name in run['loaded_modules']))
+    return {'seconds': seconds[0], 'median_seconds': seconds[len(seconds) // 2], 'repeat': repeat, 'loaded_modules': loaded_modules}
+
+def print_import_result(result):
+    print('\nimport swimlane_tools')
+    print('  {:<36} {:>10.4f}s  (median {:.4f}s)'.format('import', result['seconds'], result['median_seconds']))
+    if result['loaded_modules']:
+        print('  also loaded ' + ', '.join(result['loaded_modules']))
+
+# Writes a synthetic documentation directory in the same format that SwimlaneDocumentation saves.
+#   node_count      - number of swimlane nodes
+#   depth           - number of layers.  Nodes only use nodes in the next layer so the longest path is about depth long.
+#   fan_out         - number of used_by entries for each node
+#   fan_in          - about how many nodes use each node that's used at all
+#   cycle_fraction  - fraction of the nodes that also get a used_by entry that points back to an earlier layer
+#   freq_mix        - weights for the freq values
+#   files_per_node  - number of files that each node is described in (its used_by is split between them)
+#   nodes_per_file  - about how many node descriptions go in each file
+# Returns the number of files that were written.
+def generate_swimlane_directory(directory, node_count, depth=10, fan_out=2, fan_in=2, cycle_fraction=0.0, freq_mix=None,
+                                files_per_node=1, nodes_per_file=50, seed=0):
+    if not freq_mix:
+        freq_mix = default_freq_mix
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    depth = max(1, min(depth, node_count))
+    names = ['node_' + str(i) for i in range(node_count)]
+    layers = [names[i * node_count // depth:(i + 1) * node_count // depth] for i in range(depth)]
+    freq_values = list(freq_mix.keys())
+    freq_weights = list(freq_mix.values())
+
+    used_by = {}
+    for layer_number, layer in enumerate(layers):
+        next_layer = layers[layer_number + 1] if layer_number + 1 < depth else []
+        # Only part of the next layer is used so that the used nodes each get about fan_in inputs
+        pool_size = min(len(next_layer), max(1, math.ceil(len(layer) * fan_out / max(fan_in, 1))))
+        pool = rng.sample(next_layer, pool_size) if next_layer else []
+        for name in layer:
+            targets = rng.sample(pool, min(fan_out, len(pool))) if pool else []
+            if layer_number > 0 and rng.random() < cycle_fraction:
+                targets.append(rng.choice(layers[rng.randrange(layer_number)]))
+            used_by[name] = targets
+
+    # Spread the node descriptions over the files
+    descriptions = []
+    for name in names:
+        copies = max(1, files_per_node)
+        freq = rng.choices(freq_values, freq_weights)[0]
+        for copy_number in range(copies):
+            descriptions.append((name, {'used_by': used_by[name][copy_number::copies], 'marker': 'o', 'freq': freq}))
+    rng.shuffle(descriptions)
+    file_count = max(1, math.ceil(len(descriptions) / nodes_per_file))
+
+    files = [{} for _ in range(file_count)]
+    for i, (name, node) in enumerate(descriptions):
+        files[i % file_count].setdefault(name, node)
+    for i, swimlane_nodes in enumerate(files):
+        json_data = {'name': 'Notebook ' + str(i), 'used_by': [], 'notebook_loc': directory, 'freq': rng.choices(freq_values, freq_weights)[0],
+                     'swimlane_nodes': swimlane_nodes}
+        # The notebooks feed each other too so that the notebook graph isn't empty
+        if i + 1 < file_count:
+            json_data['used_by'] = ['Notebook_' + str(rng.randrange(i + 1, file_count))]
+        with open(os.path.join(directory, 'Notebook_' + str(i) + '.json'), 'w') as file:
+            json.dump(json_data, file, indent=4)
+    return file_count
+
+# Imports the modules that swimlane_tools defers (see lazy_import) so that whichever stage uses one first isn't timed
+# with the import.  The import is only measured by measure_import_time.
+def warm_up():
+    for global_name in ['nx', 'np', 'orjson']:
+        module = getattr(swimlane_tools, global_name)
+        if isinstance(module, SwimlaneLazyModule):
+            # Any attribute imports the module and replaces the placeholder
+            module.__name__
+
+# Runs the function and returns (result, seconds, peak traced bytes or None, retained traced bytes or None).
+# The retained bytes are what's still allocated while the result is kept.
+def measure(function, trace_memory):
+    if trace_memory:
+        gc.collect()
+        tracemalloc.reset_peak()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    peak_bytes = retained_bytes = None
+    if trace_memory:
+        peak_bytes = tracemalloc.get_traced_memory()[1] - start_bytes
+        gc.collect()
+        retained_bytes = tracemalloc.get_traced_memory()[0] - start_bytes
+    return result, seconds, peak_bytes, retained_bytes
+
+# Builds and lays out the merged nodes with a build tool and returns the tool
+def layout_build_tool(directory, compact=False):
+    build_tool = SwimlaneBuildTool(documentation_dir=directory, compact=compact)
+    build_tool.pos
+    return build_tool
+
+# Times every stage of the build for one documentation directory
+def run_stages(directory, trace_memory=False):
+    stages = {}
+
+    # With retained, the memory that the result holds on to is recorded as well
+    def stage(name, function, retained=False):
+        result, seconds, peak_bytes, retained_bytes = measure(function, trace_memory)
+        stages[name] = {'seconds': seconds}
+        if peak_bytes is not None:
+            stages[name]['peak_bytes'] = peak_bytes
+        if retained and retained_bytes is not None:
+            stages[name]['retained_bytes'] = retained_bytes
+        return result
+
+    file_names = stage('list_files', lambda: get_swimlane_file_names(directory))
+    stage('load', lambda: load_swimlane_files(file_names, directory))
+    json_nodes = stage('build_json_nodes', lambda: build_json_nodes(None, directory))
+    stage('build_json_nodes_for_notebook', lambda: build_json_nodes_for_notebook(None, directory))
+
+    layout_inputs = stage('layout_inputs', lambda: get_layout_inputs(json_nodes))
+    pos, node_colors = set_colors_and_initial_node_positions(json_nodes)
+    pos = stage('set_positions', lambda: set_positions(pos, **layout_inputs))
+    stage('label_positions', lambda: calculate_label_positions(pos, layout_inputs['max_width'], layout_inputs['max_height']))
+    initial_pos, node_colors = set_colors_and_initial_node_positions(json_nodes)
+    stage('set_final_node_and_label_positions', lambda: set_final_node_and_label_positions(initial_pos, json_nodes))
+
+    graph_build_tool = SwimlaneBuildTool(documentation_dir=directory)
+    graph_build_tool.json_nodes = json_nodes
+    # The shared graph is built once and get_initialized_DiGraph copies it
+    stage('build_graph', lambda: graph_build_tool.graph)
+    graph = stage('get_initialized_DiGraph', graph_build_tool.get_initialized_DiGraph)
+    
+    # What a laid out build tool keeps, with and without compact
+    build_tool = stage('build_tool_layout', lambda: layout_build_tool(directory), retained=True)
+    del build_tool
+    build_tool = stage('compact_build_tool_layout', lambda: layout_build_tool(directory, compact=True), retained=True)
+    del build_tool
+    return stages, len(json_nodes), graph.number_of_edges()
+
+def run_benchmarks(sizes, repeat=1, trace_memory=True, work_dir=None, **generator_options):
+    warm_up()
+    results = []
+    for size in sizes:
+        directory = tempfile.mkdtemp(prefix='swimlane_benchmark_', dir=work_dir)
+        try:
+            file_count = generate_swimlane_directory(directory, size, **generator_options)
+            # Keep the fastest of the timing runs and do the memory run on its own since tracing slows everything down
+            best_stages = None
+            for _ in range(repeat):
+                stages, node_count, edge_count = run_stages(directory)
+                if best_stages is None:
+                    best_stages = stages
+                else:
+                    for name, stage in stages.items():
+                        best_stages[name]['seconds'] = min(best_stages[name]['seconds'], stage['seconds'])
+            if trace_memory:
+                tracemalloc.start()
+                memory_stages = run_stages(directory, trace_memory=True)[0]
+                tracemalloc.stop()
+                for name, stage in memory_stages.items():
+                    best_stages[name]['peak_bytes'] = stage['peak_bytes']
+                    if 'retained_bytes' in stage:
+                        best_stages[name]['retained_bytes'] = stage['retained_bytes']
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        result = {'size': size, 'node_count': node_count, 'edge_count': edge_count, 'file_count': file_count, 'stages': best_stages}
+        results.append(result)
+        print_result(result)
+    return results
+
+def print_result(result):
+    print('\n' + str(result['size']) + ' nodes (' + str(result['edge_count']) + ' edges, ' + str(result['file_count']) + ' files)')
+    for name, stage in result['stages'].items():
+        line = '  {:<36} {:>10.4f}s'.format(name, stage['seconds'])
+        if 'peak_bytes' in stage:
+            line += '  {:>10.1f} MB peak'.format(stage['peak_bytes'] / 1e6)
+        if 'retained_bytes' in stage:
+            line += '  {:>10.1f} MB retained'.format(stage['retained_bytes'] / 1e6)
+        print(line)
+
+# Prints how each stage changed between an earlier results file and the current results
+def compare_results(previous, current):
+    if previous.get('import') and current.get('import'):
+        print('\nimport swimlane_tools compared to ' + previous.get('meta', {}).get('timestamp', 'the previous run'))
+        ratio = current['import']['seconds'] / previous['import']['seconds']
+        print('  {:<36} {:>10.4f}s -> {:>10.4f}s  ({:.2f}x)'.format('import', previous['import']['seconds'], current['import']['seconds'], ratio))
+    previous_by_size = {result['size']: result for result in previous['results']}
+    for result in current['results']:
+        previous_result = previous_by_size.get(result['size'])
+        if not previous_result:
+            continue
+        print('\n' + str(result['size']) + ' nodes compared to ' + previous.get('meta', {}).get('timestamp', 'the previous run'))
+        for name, stage in result['stages'].items():
+            previous_stage = previous_result['stages'].get(name)
+            if not previous_stage or not previous_stage['seconds']:
+                continue
+            ratio = stage['seconds'] / previous_stage['seconds']
+            print('  {:<36} {:>10.4f}s -> {:>10.4f}s  ({:.2f}x)'.format(name, previous_stage['seconds'], stage['seconds'], ratio))
+
+# Checks for the parts of the build that are easy to get subtly wrong, run with --checks.  Each one raises an exception
+# if something is off and otherwise returns a line to print.
+
+# Resolving the edge collisions should take out most of them at the size that it's meant for (10000 or so edges, with
+# some cycles so that the columns are crowded)
+def check_edge_collisions(work_dir=None, node_count=5000):
+    directory = tempfile.mkdtemp(prefix='swimlane_check_', dir=work_dir)
+    try:
+        generate_swimlane_directory(directory, node_count, cycle_fraction=0.05)
+        build_tool = SwimlaneBuildTool(documentation_dir=directory, resolve_edge_collisions=True)
+        build_tool.pos
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    record = build_tool.get_stage_stats('placement')[-1]
+    before = record['edge_collisions_before']
+    after = record['edge_collisions_after']
+    if after > before // 10:
+        raise Exception('Resolving the edge collisions only took them from ' + str(before) + ' to ' + str(after) + '.')
+    return 'edge collisions: {} -> {} on {} nodes in {:.2f}s'.format(before, after, node_count, record['seconds'])
+
+# Incremental updates (SwimlaneBuildTool.apply_changes) should leave every node that they didn't have to move where it
+# was (other than everything shifting over together to make room on the left), never put two nodes in one cell and
+# place a new producer left of what it feeds, including when that's in the first column
+def check_incremental_layout(work_dir=None, node_count=2000, steps=40):
+    directory = tempfile.mkdtemp(prefix='swimlane_check_', dir=work_dir)
+    try:
+        generate_swimlane_directory(directory, node_count, depth=8, cycle_fraction=0.02)
+        build_tool = SwimlaneBuildTool(documentation_dir=directory)
+        build_tool.pos
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    rng = random.Random(0)
+    kinds = ['producer', 'first_column_producer', 'consumer', 'modify', 'remove']
+    moved_total = 0
+    for step in range(steps):
+        kind = kinds[step % len(kinds)]
+        json_nodes = list(build_tool.json_nodes)
+        names = [node['name'] for node in json_nodes]
+        old_pos = dict(build_tool.pos)
+        added, removed, modified = [], [], []
+        if kind == 'producer':
+            consumer = rng.choice(names)
+            added = [{'name': 'producer_' + str(step), 'used_by': [consumer], 'marker': 'o', 'freq': 'd'}]
+        elif kind == 'first_column_producer':
+            first_column = min(x_pos for x_pos, y_pos in old_pos.values())
+            consumer = rng.choice([name for name in names if old_pos[name][0] == first_column])
+            added = [{'name': 'producer_' + str(step), 'used_by': [consumer], 'marker': 'o', 'freq': 'd'}]
+        elif kind == 'consumer':
+            added = [{'name': 'consumer_' + str(step), 'used_by': [], 'marker': 'o', 'freq': 'w'}]
+            modified = [dict(node, used_by=list(node['used_by']) + [added[0]['name']]) for node in rng.sample(json_nodes, 2)]
+        elif kind == 'modify':
+            node = rng.choice(json_nodes)
+            modified = [dict(node, used_by=list(node['used_by']) + [rng.choice(names)])]
+        else:
+            removed = [rng.choice(names)]
+            modified = [dict(node, used_by=[name for name in node['used_by'] if name != removed[0]])
+                        for node in json_nodes if removed[0] in node['used_by'] and node['name'] != removed[0]]
+        build_tool.apply_changes(added, removed, modified)
+        record = build_tool.get_stage_stats('incremental_placement')[-1]
+        pos = build_tool.pos
+        description = 'Step ' + str(step) + ' (' + kind + ') of the incremental layout check '
+        
+        if len(set(pos.values())) != len(pos):
+            raise Exception(description + 'put two nodes in the same cell.')
+        if record.get('backward_edge_count'):
+            raise Exception(description + 'left ' + str(record['backward_edge_count']) + ' edges pointing left and laid everything out again.')
+        changed_names = [node['name'] for node in added + modified]
+        backward_edges = find_backward_edges(pos, build_tool.json_nodes, changed_names)
+        if backward_edges:
+            raise Exception(description + 'left ' + str(backward_edges[0]) + ' pointing left.')
+        
+        # Everything that wasn't moved should be where it was, give or take a shift to the right
+        moves = {}
+        for name, (x_pos, y_pos) in old_pos.items():
+            if name in pos:
+                move = (pos[name][0] - x_pos, pos[name][1] - y_pos)
+                moves[move] = moves.get(move, 0) + 1
+        shift = max(moves, key=moves.get)
+        if shift[1] != 0 or (shift[0] != 0) != (record['shift_count'] > 0):
+            raise Exception(description + 'moved everything by ' + str(shift) + ' after ' + str(record['shift_count']) + ' shifts.')
+        moved_count = len(old_pos) - moves[shift] - len(removed)
+        allowed_count = 0 if kind in ('producer', 'first_column_producer') else record['moved_count']
+        if moved_count > allowed_count:
+            raise Exception(description + 'moved ' + str(moved_count) + ' nodes that were already placed.')
+        if kind in ('producer', 'first_column_producer') and pos[added[0]['name']][0] >= pos[consumer][0]:
+            raise Exception(description + 'put ' + added[0]['name'] + ' at ' + str(pos[added[0]['name']]) + ' but it feeds ' + consumer + ' at ' + str(pos[consumer]) + '.')
+        moved_total += moved_count
+    return 'incremental layout: {} changes to {} nodes, {} nodes already placed had to move'.format(steps, node_count, moved_total)
+
+# The reachability index should answer the same as networkx on random graphs with cycles, self loops and names that
+# are only used in a used_by list, with and without max_depth and freq, both from its bitsets and (with no room for
+# them) by walking the graph
+def check_reachability_index(work_dir=None, trials=30, seed=0):
+    import networkx as nx
+    rng = random.Random(seed)
+    query_count = 0
+    for trial in range(trials):
+        node_count = rng.randrange(2, 120)
+        names = ['node_' + str(i) for i in range(node_count)]
+        json_nodes = []
+        for i, name in enumerate(names):
+            used_by = rng.sample(names[i + 1:], min(node_count - i - 1, rng.randrange(3)))
+            if rng.random() < 0.05:
+                used_by.append(rng.choice(names))
+            if rng.random() < 0.02:
+                used_by.append('undescribed_' + str(rng.randrange(5)))
+            json_nodes.append({'name': name, 'used_by': used_by, 'freq': rng.choice('sdwu')})
+        rng.shuffle(json_nodes)
+        graph = nx.DiGraph()
+        graph.add_nodes_from(node['name'] for node in json_nodes)
+        graph.add_edges_from((node['name'], used_by_name) for node in json_nodes for used_by_name in node['used_by'])
+        reversed_graph = graph.reverse(copy=False)
+        freqs = {node['name']: node['freq'] for node in json_nodes}
+        
+        # What's within max_depth steps of name going against (or with) the edges.  name itself is only in there
+        # if it's on a cycle that short.
+        def get_expected(name, max_depth, freq, direction_graph):
+            expected = set()
+            for neighbour_name in direction_graph.successors(name):
+                if max_depth is None:
+                    expected.add(neighbour_name)
+                    expected.update(nx.descendants(direction_graph, neighbour_name))
+                else:
+                    expected.update(nx.single_source_shortest_path_length(direction_graph, neighbour_name, cutoff=max_depth - 1))
+            if freq is not None:
+                freq_values = [freq] if isinstance(freq, str) else freq
+                expected = set(name for name in expected if freqs.get(name) in freq_values)
+            return expected
+        
+        for max_bitset_bytes in (None, 0, 2000):
+            if max_bitset_bytes is None:
+                index = SwimlaneReachabilityIndex(json_nodes)
+                if not index.has_bitsets:
+                    raise Exception('The reachability index skipped its bitsets for ' + str(node_count) + ' nodes.')
+            else:
+                index = SwimlaneReachabilityIndex(json_nodes, max_bitset_bytes=max_bitset_bytes)
+            for name in rng.sample(list(graph.nodes), min(20, graph.number_of_nodes())):
+                for max_depth in (None, 1, 2, 3):
+                    for freq in (None, 'd', ['s', 'w']):
+                        for direction, direction_graph in (('upstream', reversed_graph), ('downstream', graph)):
+                            if direction == 'upstream':
+                                result = index.get_upstream(name, max_depth=max_depth, freq=freq)
+                            else:
+                                result = index.get_downstream(name, max_depth=max_depth, freq=freq)
+                            expected = get_expected(name, max_depth, freq, direction_graph)
+                            if set(result) != expected or len(result) != len(expected):
+                                raise Exception('get_' + direction + '(' + repr(name) + ', max_depth=' + str(max_depth) + ', freq=' + repr(freq) + ') with max_bitset_bytes=' +
+                                                str(max_bitset_bytes) + ' returned ' + str(sorted(result)) + ' instead of ' + str(sorted(expected)) + '.')
+                            query_count += 1
+                other_name = rng.choice(list(graph.nodes))
+                if index.is_upstream(name, other_name) != (name in get_expected(other_name, None, None, reversed_graph)):
+                    raise Exception('is_upstream(' + repr(name) + ', ' + repr(other_name) + ') with max_bitset_bytes=' + str(max_bitset_bytes) + ' is wrong.')
+                query_count += 1
+    return 'reachability index: {} queries on {} random graphs match networkx'.format(query_count, trials)
+
+checks = [check_edge_collisions, check_incremental_layout, check_reachability_index]
+
+def run_checks(work_dir=None):
+    for check in checks:
+        print(check(work_dir=work_dir))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the stages of SwimlaneBuildTool on synthetic swimlane graphs.')
+    parser.add_argument('--sizes', type=int, nargs='*', default=default_sizes, help='no sizes just runs the import benchmark')
+    parser.add_argument('--depth', type=int, default=10)
+    parser.add_argument('--fan-out', type=int, default=2)
+    parser.add_argument('--fan-in', type=int, default=2)
+    parser.add_argument('--cycle-fraction', type=float, default=0.0)
+    parser.add_argument('--freq-mix', type=json.loads, default=None, help='json weights, e.g. \'{"s": 0.1, "d": 0.9}\'')
+    parser.add_argument('--files-per-node', type=int, default=1)
+    parser.add_argument('--nodes-per-file', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-memory', action='store_true', help="don't do the (slower) peak memory run")
+    parser.add_argument('--import-repeat', type=int, default=default_import_repeat, help='new interpreters to time the import in (0 to skip)')
+    parser.add_argument('--work-dir', default=None, help='where the synthetic directories are generated')
+    parser.add_argument('--output', default=None, help='json file to write the results to')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+    parser.add_argument('--checks', action='store_true', help='run the correctness checks instead of the benchmarks')
+    args = parser.parse_args(argv)
+    if args.checks:
+        run_checks(args.work_dir)
+        return None
+
+    generator_options = {'depth': args.depth, 'fan_out': args.fan_out, 'fan_in': args.fan_in, 'cycle_fraction': args.cycle_fraction,
+                         'freq_mix': args.freq_mix, 'files_per_node': args.files_per_node, 'nodes_per_file': args.nodes_per_file,
+                         'seed': args.seed}
+    import_result = None
+    if args.import_repeat > 0:
+        import_result = measure_import_time(args.import_repeat)
+        print_import_result(import_result)
+    results = run_benchmarks(args.sizes, repeat=args.repeat, trace_memory=not args.no_memory, work_dir=args.work_dir, **generator_options)
+    output = {'meta': {'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+                       'platform': platform.platform(), 'generator': generator_options, 'repeat': args.repeat},
+              'import': import_result, 'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            compare_results(json.load(file), output)
+    return output
+
+if __name__ == '__main__':
+    main()
@@ -1,70 +1,801 @@
-import json, os
+import array, atexit, base64, bisect, concurrent.futures, copy, hashlib, heapq, importlib, importlib.util, json, logging, math, os, shutil, sqlite3, sys, threading, time
+from collections import deque
+from collections.abc import Mapping, MutableMapping, Sequence
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-import networkx as nx
+from fractions import Fraction
+
+# Importing this module only loads the standard library so that notebooks that just document their nodes with
+# SwimlaneDocumentation don't pay for networkx and NumPy.  Each of them is a placeholder until it's first used, at
+# which point the real module is imported and replaces the placeholder.  (Matplotlib and SciPy are imported inside of
+# the functions that use them.)
+class SwimlaneLazyModule:
+    
+    def __init__(self, module_name, global_name):
+        self.module_name = module_name
+        self.global_name = global_name
+    
+    def __getattr__(self, name):
+        module = importlib.import_module(self.module_name)
+        globals()[self.global_name] = module
+        return getattr(module, name)
+
+# Optional modules that aren't installed are None
+def lazy_import(module_name, global_name, optional=False):
+    if optional and importlib.util.find_spec(module_name) is None:
+        return None
+    return SwimlaneLazyModule(module_name, global_name)
+
+nx = lazy_import('networkx', 'nx')
+
+# NumPy is optional.  It's used for the compact graph, the edge collision checks, the edge arrays and rendering.
+np = lazy_import('numpy', 'np', optional=True)
+
+# Use a faster JSON decoder when one is installed
+orjson = lazy_import('orjson', 'orjson', optional=True)
+
+# Nothing is logged unless the application configures logging (e.g. logging.basicConfig(level=logging.DEBUG))
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
 
 label_offset = 0.3
 frequency_values = ['s', 'd', 'w', 'u']
 color_chart = {'s': 'orange', 'd': 'green', 'w': 'skyblue', 'u': 'yellow'}
 default_swimlane_directory = './swimlane_files'
+# Small integer codes for the freq values.  A missing or unrecognized freq gets unknown_frequency_code.
+frequency_codes = {freq: code for code, freq in enumerate(frequency_values)}
+unknown_frequency_code = len(frequency_values)
 notebook_keys = ['used_by', 'marker', 'freq']
+# Number of threads (or processes) used to load the documentation directory and the fewest files worth using them for
+default_load_workers = min(32, (os.cpu_count() or 1) + 4)
+min_files_for_parallel_load = 16
+# The component layout only uses a process pool once there are this many nodes
+min_nodes_for_parallel_layout = 5000
+# The reachability index gives up on its bitsets once they take more than this many bytes and queries walk the graph
+# instead.  A lineage's bitsets only span that lineage, so a graph made of 50-node pipelines takes about 30 MB at 50000
+# nodes, while a dense synthetic graph where the average lineage is 40% of the nodes takes about 55 MB at 20000 nodes and
+# 290 MB at 50000 nodes.
+max_reachability_bitset_bytes = 512 * 1024 * 1024
+
+# Make sure that a used_by value is always a list of strings
+def normalize_used_by(used_by):
+    if not used_by:
+        return []
+    if isinstance(used_by, str):
+        return [used_by]
+    return used_by
+
+# Index of the json nodes that is built once so that the layout helpers don't have to rescan the whole list for every node.
+# Names are interned to integer ids in the order that they are first seen (nodes first, then any used_by references
+# to names that aren't described by a node).  used_by holds the forward edges and children holds the reverse ones.
+class SwimlaneGraphIndex:
+    
+    def __init__(self, json_nodes):
+        self.names = []
+        self.name_to_id = {}
+        self.used_by = []
+        self.children = []
+        
+        for node in json_nodes:
+            self.intern(node['name'])
+        self.node_count = len(self.names)
+        
+        for node in json_nodes:
+            node_id = self.name_to_id[node['name']]
+            seen = set()
+            for used_by_name in normalize_used_by(node.get('used_by', [])):
+                used_by_id = self.intern(used_by_name)
+                self.used_by[node_id].append(used_by_id)
+                # A node only counts once as a child even if it lists the same parent twice
+                if used_by_id not in seen:
+                    seen.add(used_by_id)
+                    self.children[used_by_id].append(node_id)
+    
+    def intern(self, name):
+        node_id = self.name_to_id.get(name)
+        if node_id is None:
+            node_id = len(self.names)
+            self.name_to_id[name] = node_id
+            self.names.append(name)
+            self.used_by.append([])
+            self.children.append([])
+        return node_id
+    
+    def get_id(self, name):
+        return self.name_to_id.get(name)
+    
+    def get_children(self, node_name):
+        node_id = self.name_to_id.get(node_name)
+        if node_id is None:
+            return []
+        return [self.names[child_id] for child_id in self.children[node_id]]
+    
+    def get_used_by(self, node_name):
+        node_id = self.name_to_id.get(node_name)
+        if node_id is None:
+            return []
+        return [self.names[used_by_id] for used_by_id in self.used_by[node_id]]
+    
+    # Nodes that aren't in anything's used_by list
+    def get_base_node_names(self):
+        return [self.names[node_id] for node_id in range(self.node_count) if not self.children[node_id]]
+    
+    # Nodes that don't use anything (no used_by setting or an empty array)
+    def get_final_node_names(self):
+        return [self.names[node_id] for node_id in range(self.node_count) if not self.used_by[node_id]]
+
+# The edges of the json nodes as NumPy arrays for callers that don't need networkx.  Returns (node_names, sources, targets)
+# where each edge goes from node_names[sources[i]] to node_names[targets[i]].  node_names are in the same order as the
+# nodes of SwimlaneBuildTool.get_initialized_DiGraph (the json nodes and then the names that are only used in a used_by
+# list) and, like the DiGraph, each edge is only listed once.
+def get_edge_arrays(json_nodes):
+    if np is None:
+        raise Exception('NumPy is needed for the edge arrays.')
+    # Ids are handed out the same way as SwimlaneGraphIndex without building the rest of the index
+    name_to_id = {}
+    for node in json_nodes:
+        name_to_id.setdefault(node['name'], len(name_to_id))
+    sources = array.array('q')
+    targets = array.array('q')
+    for node in json_nodes:
+        node_id = name_to_id[node['name']]
+        for used_by_name in normalize_used_by(node.get('used_by', [])):
+            used_by_id = name_to_id.get(used_by_name)
+            if used_by_id is None:
+                used_by_id = name_to_id[used_by_name] = len(name_to_id)
+            sources.append(node_id)
+            targets.append(used_by_id)
+    node_count = len(name_to_id)
+    sources = np.frombuffer(sources, dtype=np.int64).copy()
+    targets = np.frombuffer(targets, dtype=np.int64).copy()
+    # Keep the first of any repeated edges
+    first_index = np.unique(sources * node_count + targets, return_index=True)[1]
+    if len(first_index) != len(sources):
+        keep = np.sort(first_index)
+        sources = sources[keep]
+        targets = targets[keep]
+    return list(name_to_id), sources, targets
+
+# SciPy sparse adjacency matrix for the edge arrays from get_edge_arrays.  matrix[i, j] is 1 when node_names[i] is used by
+# node_names[j].  format is any SciPy sparse format such as 'csr', 'csc' or 'coo'.
+def build_sparse_adjacency(node_names, sources, targets, format='csr', dtype='int64'):
+    try:
+        import scipy.sparse
+    except ImportError:
+        raise Exception('SciPy is needed for the sparse adjacency matrix.')
+    node_count = len(node_names)
+    matrix = scipy.sparse.coo_matrix((np.ones(len(sources), dtype=dtype), (sources, targets)), shape=(node_count, node_count))
+    return matrix.asformat(format)
+
+# Compact, array backed version of the json nodes for large graphs.  Names are interned to integer ids, used_by is
+# stored as CSR arrays (used_by_offsets/used_by_targets), freq and marker are small integer codes and the positions
+# are NumPy x/y arrays.  json_nodes_view(), positions_view() and colors_view() give the older list and dictionary
+# forms without having to keep a dictionary for every node around.  Requires NumPy.
+class SwimlaneCompactGraph:
+    
+    def __init__(self, json_nodes):
+        if np is None:
+            raise Exception('NumPy is needed for the compact graph representation.')
+        self.names = []
+        self.name_to_id = {}
+        for node in json_nodes:
+            self.intern(node['name'])
+        # Ids past node_count are used_by references to names that aren't described by a node
+        self.node_count = len(self.names)
+        
+        offsets = [0]
+        targets = []
+        has_used_by = []
+        freq_codes = []
+        self.marker_values = [None]
+        marker_to_code = {None: 0}
+        marker_codes = []
+        # Anything that doesn't fit in the arrays (notes, unrecognized freq values, ...) by node id
+        self.extras = {}
+        for node_id, node in enumerate(json_nodes):
+            for used_by_name in normalize_used_by(node.get('used_by', [])):
+                targets.append(self.intern(used_by_name))
+            offsets.append(len(targets))
+            has_used_by.append('used_by' in node)
+            
+            freq = node.get('freq')
+            freq_codes.append(frequency_codes.get(freq, unknown_frequency_code))
+            marker = node.get('marker')
+            marker_code = marker_to_code.get(marker)
+            if marker_code is None:
+                marker_code = marker_to_code[marker] = len(self.marker_values)
+                self.marker_values.append(marker)
+            marker_codes.append(marker_code)
+            
+            extra = {key: value for key, value in node.items() if key not in ('name', 'used_by', 'freq', 'marker')}
+            if freq is not None and freq not in frequency_codes:
+                extra['freq'] = freq
+            if extra:
+                self.extras[node_id] = extra
+        
+        id_type = np.int32 if len(self.names) < 2**31 else np.int64
+        self.used_by_offsets = np.array(offsets, dtype=np.int64)
+        self.used_by_targets = np.array(targets, dtype=id_type)
+        self.has_used_by = np.array(has_used_by, dtype=bool)
+        self.freq_codes = np.array(freq_codes, dtype=np.uint8)
+        self.marker_codes = np.array(marker_codes, dtype=np.uint8 if len(self.marker_values) < 256 else np.int32)
+        self.children_offsets = None
+        self.children_sources = None
+        
+        # Unplaced nodes start at -0.5, -0.5 just like set_colors_and_initial_node_positions
+        self.x = np.full(self.node_count, -0.5)
+        self.y = np.full(self.node_count, -0.5)
+        self.label_x = np.full(self.node_count, -0.5)
+        self.label_y = np.full(self.node_count, -0.5)
+    
+    def intern(self, name):
+        node_id = self.name_to_id.get(name)
+        if node_id is None:
+            node_id = len(self.names)
+            self.name_to_id[name] = node_id
+            self.names.append(name)
+        return node_id
+    
+    def get_id(self, name):
+        return self.name_to_id.get(name)
+    
+    @property
+    def edge_count(self):
+        return len(self.used_by_targets)
+    
+    def get_used_by_ids(self, node_id):
+        if node_id >= self.node_count:
+            return self.used_by_targets[0:0]
+        return self.used_by_targets[self.used_by_offsets[node_id]:self.used_by_offsets[node_id + 1]]
+    
+    def get_used_by(self, node_name):
+        node_id = self.name_to_id.get(node_name)
+        if node_id is None:
+            return []
+        return [self.names[used_by_id] for used_by_id in self.get_used_by_ids(node_id).tolist()]
+    
+    # The reverse CSR arrays are only built the first time that they're needed
+    def build_children(self):
+        sources = np.repeat(np.arange(self.node_count, dtype=self.used_by_targets.dtype), np.diff(self.used_by_offsets))
+        order = np.argsort(self.used_by_targets, kind='stable')
+        self.children_sources = sources[order]
+        counts = np.bincount(self.used_by_targets, minlength=len(self.names)) if len(self.used_by_targets) else np.zeros(len(self.names), dtype=np.int64)
+        self.children_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    
+    def get_children_ids(self, node_id):
+        if self.children_offsets is None:
+            self.build_children()
+        children = self.children_sources[self.children_offsets[node_id]:self.children_offsets[node_id + 1]]
+        # A node only counts once as a child even if it lists the same parent twice
+        return list(dict.fromkeys(children.tolist()))
+    
+    def get_children(self, node_name):
+        node_id = self.name_to_id.get(node_name)
+        if node_id is None:
+            return []
+        return [self.names[child_id] for child_id in self.get_children_ids(node_id)]
+    
+    # Builds the json node dictionary for a single node
+    def get_node(self, node_id):
+        node = {}
+        if self.has_used_by[node_id]:
+            node['used_by'] = [self.names[used_by_id] for used_by_id in self.get_used_by_ids(node_id).tolist()]
+        marker = self.marker_values[self.marker_codes[node_id]]
+        if marker is not None:
+            node['marker'] = marker
+        freq_code = self.freq_codes[node_id]
+        if freq_code != unknown_frequency_code:
+            node['freq'] = frequency_values[freq_code]
+        node.update(self.extras.get(node_id, {}))
+        node['name'] = self.names[node_id]
+        return node
+    
+    def json_nodes_view(self):
+        return SwimlaneJsonNodesView(self)
+    
+    def to_json_nodes(self):
+        return [self.get_node(node_id) for node_id in range(self.node_count)]
+    
+    def set_positions(self, pos, label_pos=None):
+        for node_name, (x_pos, y_pos) in pos.items():
+            node_id = self.name_to_id[node_name]
+            self.x[node_id] = x_pos
+            self.y[node_id] = y_pos
+        if label_pos:
+            for node_name, (x_pos, y_pos) in label_pos.items():
+                node_id = self.name_to_id[node_name]
+                self.label_x[node_id] = x_pos
+                self.label_y[node_id] = y_pos
+    
+    def positions_view(self):
+        return SwimlanePositionsView(self, self.x, self.y)
+    
+    def label_positions_view(self):
+        return SwimlanePositionsView(self, self.label_x, self.label_y)
+    
+    def colors_view(self):
+        return SwimlaneColorsView(self)
+
+# Read only list of json node dictionaries that are built from a SwimlaneCompactGraph as they're used.
+# Changing one of the dictionaries doesn't change the graph.
+class SwimlaneJsonNodesView(Sequence):
+    
+    def __init__(self, compact_graph):
+        self.compact_graph = compact_graph
+    
+    def __len__(self):
+        return self.compact_graph.node_count
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.compact_graph.get_node(node_id) for node_id in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('json node index out of range')
+        return self.compact_graph.get_node(index)
+
+# pos style dictionary of name -> (x, y) that reads and writes a pair of NumPy arrays
+class SwimlanePositionsView(MutableMapping):
+    
+    def __init__(self, compact_graph, x, y):
+        self.compact_graph = compact_graph
+        self.x = x
+        self.y = y
+    
+    def __getitem__(self, node_name):
+        node_id = self.compact_graph.name_to_id.get(node_name)
+        if node_id is None or node_id >= self.compact_graph.node_count:
+            raise KeyError(node_name)
+        return (self.x[node_id].item(), self.y[node_id].item())
+    
+    def __setitem__(self, node_name, coords):
+        node_id = self.compact_graph.name_to_id.get(node_name)
+        if node_id is None or node_id >= self.compact_graph.node_count:
+            raise KeyError(node_name)
+        (self.x[node_id], self.y[node_id]) = coords
+    
+    def __delitem__(self, node_name):
+        raise TypeError('Nodes can not be removed from a compact graph position view.')
+    
+    def __iter__(self):
+        return iter(self.compact_graph.names[:self.compact_graph.node_count])
+    
+    def __len__(self):
+        return self.compact_graph.node_count
+
+# node_colors style dictionary of name -> color that's backed by the freq codes
+class SwimlaneColorsView(Mapping):
+    
+    def __init__(self, compact_graph):
+        self.compact_graph = compact_graph
+        self.code_colors = [color_chart[freq] for freq in frequency_values] + ['lightyellow']
+    
+    def __getitem__(self, node_name):
+        node_id = self.compact_graph.name_to_id.get(node_name)
+        if node_id is None or node_id >= self.compact_graph.node_count:
+            raise KeyError(node_name)
+        return self.code_colors[self.compact_graph.freq_codes[node_id]]
+    
+    def __iter__(self):
+        return iter(self.compact_graph.names[:self.compact_graph.node_count])
+    
+    def __len__(self):
+        return self.compact_graph.node_count
 
-# Method that determines the exact integer nodes that a vector traverses through
+# Method that determines the exact integer nodes that a vector traverses through (not including the end points).
+# The math is done with fractions so that any slope works and rows like 1.5 don't pick up rounding errors.
 def get_traversed_integer_nodes(start_point, end_point):
     integer_coords = []
-    print('\nstart_point:', start_point, 'end_point:', end_point)
-    (x0, y0) = start_point
-    (x1, y1) = end_point
-    min_y = min(y0, y1)
+    (x0, y0) = [Fraction(value) for value in start_point]
+    (x1, y1) = [Fraction(value) for value in end_point]
     
     if x0 == x1:
         # Vertical slope
+        if x0.denominator != 1:
+            return integer_coords
+        min_y = min(y0, y1)
         max_y = max(y0, y1)
-        for y in range(min_y+1, max_y):
-            integer_coords.append(x0, y)
+        for y in range(math.floor(min_y)+1, math.ceil(max_y)):
+            integer_coords.append((int(x0), y))
     else:
-        slope = (y1-y0)  / (x1-x0)
-        if slope == int(slope):
-            slope = abs(int(slope))
-            min_x = min(x0, x1)
-            max_x = max(x0, x1)
-            print('slope:', slope)
-            for i, x in enumerate(range(min_x+1, max_x)):
-    #             print('i,x:', i, x)
-                if slope == 0:
-                    # Everything is on the same row
-                    integer_coords.append(x, y0)
-                else:
-                    integer_coords.append(x, min_y+((i+1)*slope))
+        slope = (y1-y0) / (x1-x0)
+        min_x = min(x0, x1)
+        max_x = max(x0, x1)
+        for x in range(math.floor(min_x)+1, math.ceil(max_x)):
+            y = y0 + slope * (x - x0)
+            if y.denominator == 1:
+                integer_coords.append((x, int(y)))
                 
     return integer_coords
 
 # Method to determine number of child nodes that a node uses
 def determine_children_for_parent(graph, node_name):
-    children = []
-    for item in graph:
-        if node_name in item.get('used_by', []):
-            children.append(item.get('name'))
-            
-    return children
+    # The graph can either be a SwimlaneGraphIndex or the older list of json nodes
+    if not isinstance(graph, SwimlaneGraphIndex):
+        graph = SwimlaneGraphIndex(graph)
+    return graph.get_children(node_name)
 
-# This helps to determine the length of the x-axis
-def find_longest_path_from_final(graph, node_name, names_in_path=[]):  # TODO: Change names_in_path default to None and set if None.
-    longest_path = []
+# Iterative version of Tarjan's algorithm so that deep graphs can't hit the recursion limit.
+# adjacency is a list of lists of integer ids.  Returns the component id for every node and the list of components.
+# Components are emitted after every component that they can reach, so the list is in reverse topological order.
+def find_strongly_connected_components(adjacency):
+    num_nodes = len(adjacency)
+    index = [-1] * num_nodes
+    low = [0] * num_nodes
+    on_stack = [False] * num_nodes
+    component = [-1] * num_nodes
+    components = []
+    stack = []
+    counter = 0
     
-    for item in graph:
-        if 'used_by' not in item or node_name not in item['used_by']:
+    for root in range(num_nodes):
+        if index[root] != -1:
             continue
-        child_name = item['name']
-        # Don't recurse on items that reference theirselves in the used_by array
-        if node_name == child_name or child_name in names_in_path:
-            continue
-            
-        names_in_path.append(child_name)
-        path = [child_name] + find_longest_path_from_final(graph, child_name, names_in_path=names_in_path)
-        if len(path) > len(longest_path):
-            longest_path = path
-            
-    return longest_path
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, 0)]
+        while work:
+            node_id, i = work[-1]
+            neighbors = adjacency[node_id]
+            if i < len(neighbors):
+                work[-1] = (node_id, i + 1)
+                neighbor_id = neighbors[i]
+                if index[neighbor_id] == -1:
+                    index[neighbor_id] = low[neighbor_id] = counter
+                    counter += 1
+                    stack.append(neighbor_id)
+                    on_stack[neighbor_id] = True
+                    work.append((neighbor_id, 0))
+                elif on_stack[neighbor_id] and index[neighbor_id] < low[node_id]:
+                    low[node_id] = index[neighbor_id]
+            else:
+                work.pop()
+                if work:
+                    caller_id = work[-1][0]
+                    if low[node_id] < low[caller_id]:
+                        low[caller_id] = low[node_id]
+                if low[node_id] == index[node_id]:
+                    members = []
+                    while True:
+                        member_id = stack.pop()
+                        on_stack[member_id] = False
+                        component[member_id] = len(components)
+                        members.append(member_id)
+                        if member_id == node_id:
+                            break
+                    members.sort()
+                    components.append(members)
+    return component, components
+
+# This helps to determine the length of the x-axis.
+# The longest path (following the children) from every node is computed in a single pass over the condensed graph.
+# Cycles (including nodes that reference themselves in the used_by array) are collapsed into one step on the path.
+class SwimlaneLongestPaths:
+    
+    def __init__(self, graph_index):
+        self.graph_index = graph_index
+        children = graph_index.children
+        self.component, self.components = find_strongly_connected_components(children)
+        
+        # Components are already in reverse topological order so everything they point to has been computed
+        self.lengths = [0] * len(self.components)
+        self.exit_targets = [None] * len(self.components)
+        for component_id, members in enumerate(self.components):
+            best_length = 0
+            best_target = None
+            for member_id in members:
+                for child_id in children[member_id]:
+                    child_component_id = self.component[child_id]
+                    if child_component_id != component_id and self.lengths[child_component_id] > best_length:
+                        best_length = self.lengths[child_component_id]
+                        best_target = child_id
+            self.lengths[component_id] = best_length + 1
+            self.exit_targets[component_id] = best_target
+    
+    def get_length(self, node_name):
+        node_id = self.graph_index.get_id(node_name)
+        if node_id is None:
+            return 0
+        return self.lengths[self.component[node_id]]
+    
+    # Returns the longest path starting with (and including) node_name
+    def get_path(self, node_name):
+        node_id = self.graph_index.get_id(node_name)
+        if node_id is None:
+            return [node_name]
+        names = self.graph_index.names
+        path = [node_name]
+        target_id = self.exit_targets[self.component[node_id]]
+        while target_id is not None:
+            path.append(names[target_id])
+            target_id = self.exit_targets[self.component[target_id]]
+        return path
+    
+    # Returns the longest path for each of the final nodes along with the longest length (the max_width)
+    def get_final_node_paths(self):
+        longest_parent_paths = {}
+        max_width = 0
+        for node_name in self.graph_index.get_final_node_names():
+            longest_path = self.get_path(node_name)
+            longest_parent_paths[node_name] = longest_path
+            if len(longest_path) > max_width:
+                max_width = len(longest_path)
+        return longest_parent_paths, max_width
+
+# Kept for older callers.  names_in_path is no longer needed since cycles are handled by SwimlaneLongestPaths.
+def find_longest_path_from_final(graph, node_name, names_in_path=None):
+    if not isinstance(graph, SwimlaneGraphIndex):
+        graph = SwimlaneGraphIndex(graph)
+    return SwimlaneLongestPaths(graph).get_path(node_name)[1:]
+
+# Returns the positions of the bits that are set in an int
+def get_bit_positions(bits):
+    text = bin(bits)[:1:-1]
+    positions = []
+    position = text.find('1')
+    while position != -1:
+        positions.append(position)
+        position = text.find('1', position + 1)
+    return positions
+
+# Answers upstream (what feeds a node) and downstream (what a node feeds) questions without a graph traversal.
+# Nodes are ranked in topological order (producers first, with the members of a cycle next to each other) and the
+# upstream and downstream sets of every strongly connected component are kept as int bitsets over those ranks.  A query
+# is then a couple of int operations plus decoding the answer.  Each upstream bitset is shifted down to its lowest
+# rank and each downstream bitset to the component's first rank, so a bitset only spans its own lineage.  If the
+# bitsets would take more than max_bitset_bytes, they're dropped (has_bitsets is False and bitset_bytes says how far
+# it got) and every query is a breadth first search that only visits the answer, as are queries with a max_depth.
+class SwimlaneReachabilityIndex:
+    
+    def __init__(self, json_nodes, max_bitset_bytes=max_reachability_bitset_bytes):
+        self.graph_index = graph_index = SwimlaneGraphIndex(json_nodes)
+        component, components = find_strongly_connected_components(graph_index.children)
+        node_total = len(graph_index.names)
+        
+        # Keep the components of each weakly connected part of the graph next to each other (in the same topological
+        # order) so that the bitsets of a lineage only span that lineage rather than the whole graph
+        parent = list(range(node_total))
+        for node_id in range(node_total):
+            for used_by_id in graph_index.used_by[node_id]:
+                node_root = node_id
+                while parent[node_root] != node_root:
+                    parent[node_root] = parent[parent[node_root]]
+                    node_root = parent[node_root]
+                used_by_root = used_by_id
+                while parent[used_by_root] != used_by_root:
+                    parent[used_by_root] = parent[parent[used_by_root]]
+                    used_by_root = parent[used_by_root]
+                parent[max(node_root, used_by_root)] = min(node_root, used_by_root)
+        
+        def get_root(node_id):
+            while parent[node_id] != node_id:
+                node_id = parent[node_id]
+            return node_id
+        
+        component_order = sorted(range(len(components)), key=lambda component_id: get_root(components[component_id][0]))
+        new_component_ids = [0] * len(components)
+        for new_component_id, component_id in enumerate(component_order):
+            new_component_ids[component_id] = new_component_id
+        self.components = [components[component_id] for component_id in component_order]
+        self.component = [new_component_ids[component_id] for component_id in component]
+        
+        self.order = [node_id for members in self.components for node_id in members]
+        self.rank = [0] * node_total
+        for rank, node_id in enumerate(self.order):
+            self.rank[node_id] = rank
+        self.component_start = []
+        start = 0
+        for members in self.components:
+            self.component_start.append(start)
+            start += len(members)
+        # Members of a cycle (or a node that uses itself) are upstream and downstream of each other
+        self.is_cyclic = [len(members) > 1 or members[0] in graph_index.used_by[members[0]] for members in self.components]
+        
+        # Where each node is in json_nodes (so that a lineage can be pulled out) and its freq
+        self.json_nodes = json_nodes
+        self.json_node_positions = [None] * node_total
+        self.node_freqs = [None] * node_total
+        for position, node in enumerate(json_nodes):
+            node_id = graph_index.get_id(node['name'])
+            if self.json_node_positions[node_id] is None:
+                self.json_node_positions[node_id] = position
+                self.node_freqs[node_id] = node.get('freq')
+        
+        self.upstream_bits = None
+        self.upstream_offsets = None
+        self.downstream_bits = None
+        self.freq_masks = {}
+        self.bitset_bytes = 0
+        self.has_bitsets = self.build_bitsets(max_bitset_bytes)
+        if not self.has_bitsets:
+            logger.info('The reachability bitsets for %d nodes would take more than %d bytes, so lineage queries will search the graph',
+                        node_total, max_bitset_bytes)
+    
+    # Returns False (and leaves the bitsets as None) if they would take more than max_bitset_bytes
+    def build_bitsets(self, max_bitset_bytes):
+        graph_index = self.graph_index
+        component_count = len(self.components)
+        bitset_bytes = 0
+        
+        # Producers always come before their consumers
+        upstream_bits = [0] * component_count
+        upstream_offsets = [0] * component_count
+        for component_id, members in enumerate(self.components):
+            child_component_ids = set(self.component[child_id] for member_id in members for child_id in graph_index.children[member_id])
+            child_component_ids.discard(component_id)
+            # The lowest rank that's upstream, which is where this bitset starts
+            offset = min((min(upstream_offsets[child_component_id], self.component_start[child_component_id]) for child_component_id in child_component_ids),
+                         default=self.component_start[component_id])
+            bits = 0
+            for child_component_id in child_component_ids:
+                child_start = self.component_start[child_component_id] - offset
+                bits |= (upstream_bits[child_component_id] << (upstream_offsets[child_component_id] - offset)) \
+                    | (((1 << len(self.components[child_component_id])) - 1) << child_start)
+            upstream_bits[component_id] = bits
+            upstream_offsets[component_id] = offset
+            bitset_bytes += sys.getsizeof(upstream_bits[component_id])
+            if bitset_bytes > max_bitset_bytes:
+                self.bitset_bytes = bitset_bytes
+                return False
+        
+        downstream_bits = [0] * component_count
+        for component_id in range(component_count - 1, -1, -1):
+            start = self.component_start[component_id]
+            bits = 0
+            for member_id in self.components[component_id]:
+                for used_by_id in graph_index.used_by[member_id]:
+                    used_by_component_id = self.component[used_by_id]
+                    if used_by_component_id != component_id:
+                        used_by_start = self.component_start[used_by_component_id]
+                        used_by_bits = downstream_bits[used_by_component_id] | ((1 << len(self.components[used_by_component_id])) - 1)
+                        bits |= used_by_bits << (used_by_start - start)
+            downstream_bits[component_id] = bits
+            bitset_bytes += sys.getsizeof(bits)
+            if bitset_bytes > max_bitset_bytes:
+                self.bitset_bytes = bitset_bytes
+                return False
+        
+        for freq in set(self.node_freqs):
+            text = ''.join('1' if self.node_freqs[node_id] == freq else '0' for node_id in reversed(self.order))
+            self.freq_masks[freq] = int(text, 2) if text else 0
+        self.upstream_bits = upstream_bits
+        self.upstream_offsets = upstream_offsets
+        self.downstream_bits = downstream_bits
+        self.bitset_bytes = bitset_bytes
+        return True
+    
+    def get_node_id(self, node_name):
+        node_id = self.graph_index.get_id(node_name)
+        if node_id is None:
+            raise Exception(str(node_name) + ' is not in the swimlane graph!')
+        return node_id
+    
+    def get_freq_mask(self, freq):
+        if isinstance(freq, str):
+            freq = [freq]
+        mask = 0
+        for freq_value in freq:
+            mask |= self.freq_masks.get(freq_value, 0)
+        return mask
+    
+    def matches_freq(self, node_id, freq):
+        if freq is None:
+            return True
+        if isinstance(freq, str):
+            return self.node_freqs[node_id] == freq
+        return self.node_freqs[node_id] in freq
+    
+    # Node ids that are reachable in at most max_depth steps in order of their rank
+    def search(self, node_id, adjacency, max_depth, freq):
+        depth = 0
+        found = {node_id: 0}
+        frontier = [node_id]
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            next_frontier = []
+            for frontier_id in frontier:
+                for neighbor_id in adjacency[frontier_id]:
+                    if neighbor_id not in found:
+                        found[neighbor_id] = depth
+                        next_frontier.append(neighbor_id)
+            frontier = next_frontier
+        # The node only counts if it leads back to itself
+        if not (self.is_cyclic[self.component[node_id]] and (max_depth is None or self.get_cycle_length(node_id, adjacency, max_depth))):
+            del found[node_id]
+        result_ids = [found_id for found_id in found if self.matches_freq(found_id, freq)]
+        result_ids.sort(key=self.rank.__getitem__)
+        return result_ids
+    
+    # Whether there's a path from the node back to itself within max_depth steps
+    def get_cycle_length(self, node_id, adjacency, max_depth):
+        seen = {node_id}
+        frontier = [node_id]
+        for depth in range(1, max_depth + 1):
+            next_frontier = []
+            for frontier_id in frontier:
+                for neighbor_id in adjacency[frontier_id]:
+                    if neighbor_id == node_id:
+                        return depth
+                    if neighbor_id not in seen:
+                        seen.add(neighbor_id)
+                        next_frontier.append(neighbor_id)
+            frontier = next_frontier
+        return None
+    
+    def get_upstream_ids(self, node_id, max_depth=None, freq=None):
+        if max_depth is not None or self.upstream_bits is None:
+            return self.search(node_id, self.graph_index.children, max_depth, freq)
+        component_id = self.component[node_id]
+        offset = self.upstream_offsets[component_id]
+        bits = self.upstream_bits[component_id]
+        if self.is_cyclic[component_id]:
+            bits |= ((1 << len(self.components[component_id])) - 1) << (self.component_start[component_id] - offset)
+        if freq is not None:
+            bits &= self.get_freq_mask(freq) >> offset
+        return [self.order[offset + rank] for rank in get_bit_positions(bits)]
+    
+    def get_downstream_ids(self, node_id, max_depth=None, freq=None):
+        if max_depth is not None or self.downstream_bits is None:
+            return self.search(node_id, self.graph_index.used_by, max_depth, freq)
+        component_id = self.component[node_id]
+        start = self.component_start[component_id]
+        bits = self.downstream_bits[component_id]
+        if self.is_cyclic[component_id]:
+            bits |= (1 << len(self.components[component_id])) - 1
+        if freq is not None:
+            bits &= self.get_freq_mask(freq) >> start
+        return [self.order[start + rank] for rank in get_bit_positions(bits)]
+    
+    # Everything that feeds node_name (within max_depth steps), optionally only the nodes with one of the freq values
+    def get_upstream(self, node_name, max_depth=None, freq=None):
+        names = self.graph_index.names
+        return [names[node_id] for node_id in self.get_upstream_ids(self.get_node_id(node_name), max_depth, freq)]
+    
+    # Everything that node_name feeds (within max_depth steps), optionally only the nodes with one of the freq values
+    def get_downstream(self, node_name, max_depth=None, freq=None):
+        names = self.graph_index.names
+        return [names[node_id] for node_id in self.get_downstream_ids(self.get_node_id(node_name), max_depth, freq)]
+    
+    # Does node_name feed other_name (directly or through other nodes)
+    def is_upstream(self, node_name, other_name):
+        node_id = self.get_node_id(node_name)
+        other_id = self.get_node_id(other_name)
+        if self.upstream_bits is None:
+            return node_id in self.search(other_id, self.graph_index.children, None, None)
+        component_id = self.component[other_id]
+        if self.component[node_id] == component_id:
+            return self.is_cyclic[component_id]
+        # Producers always come first so anything later in the order can't be upstream
+        rank = self.rank[node_id]
+        offset = self.upstream_offsets[component_id]
+        if rank >= self.component_start[component_id] or rank < offset:
+            return False
+        return bool(self.upstream_bits[component_id] >> (rank - offset) & 1)
+    
+    # The json nodes for node_name and everything upstream and/or downstream of it (direction is 'upstream',
+    # 'downstream' or 'both') with the used_by lists cut down to just those nodes
+    def get_lineage_json_nodes(self, node_name, direction='both', max_depth=None, freq=None):
+        if direction not in ('upstream', 'downstream', 'both'):
+            raise Exception('The direction has to be upstream, downstream or both, not ' + str(direction) + '.')
+        node_id = self.get_node_id(node_name)
+        lineage_ids = {node_id}
+        if direction != 'downstream':
+            lineage_ids.update(self.get_upstream_ids(node_id, max_depth, freq))
+        if direction != 'upstream':
+            lineage_ids.update(self.get_downstream_ids(node_id, max_depth, freq))
+        
+        # Only the nodes that are described can be laid out
+        positions = sorted(self.json_node_positions[lineage_id] for lineage_id in lineage_ids if self.json_node_positions[lineage_id] is not None)
+        lineage_names = set(self.graph_index.names[lineage_id] for lineage_id in lineage_ids if self.json_node_positions[lineage_id] is not None)
+        lineage_json_nodes = []
+        for position in positions:
+            node = copy_node_dict(self.json_nodes[position])
+            node['used_by'] = [used_by_name for used_by_name in normalize_used_by(node.get('used_by', [])) if used_by_name in lineage_names]
+            lineage_json_nodes.append(node)
+        return lineage_json_nodes
 
 def calculate_node_positions(height, num_nodes):
     if num_nodes == 1:
@@ -101,9 +832,100 @@ def load_swimlane_file(swimlane_file_name, documentation_dir):
             json_data = json.load(file)
             file.close()
     else:
-        print('Could not find the', json_file_name, 'file.')        
+        logger.info('Could not find the %s file.', json_file_name)
     return json_data
 
+# Syncs a directory so that a rename in it survives a crash.  Windows can't open a directory so it's skipped there.
+def sync_directory(directory):
+    if os.name != 'posix':
+        return
+    fd = os.open(directory or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# Calls write(file) on a temporary file, syncs it to disk and then renames it over file_name so that neither a reader
+# nor a crash can see a truncated file.  The new file keeps the permissions of the file that it replaces.
+def write_file_atomically(file_name, write, binary=False):
+    temp_file_name = file_name + '.' + str(os.getpid()) + '.tmp'
+    try:
+        with open(temp_file_name, 'wb' if binary else 'w') as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(file_name):
+            shutil.copymode(file_name, temp_file_name)
+        os.replace(temp_file_name, file_name)
+    except BaseException:
+        if os.path.exists(temp_file_name):
+            os.remove(temp_file_name)
+        raise
+    sync_directory(os.path.dirname(file_name))
+
+def write_swimlane_file(json_file_name, json_data):
+    write_file_atomically(json_file_name, lambda file: json.dump(json_data, file, indent=4))
+
+def parse_json(content):
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+def dump_json(json_data, file):
+    if orjson is not None:
+        file.write(orjson.dumps(json_data))
+    else:
+        file.write(json.dumps(json_data, separators=(',', ':')).encode())
+
+# Reads and parses a single file for the bulk loader.  Returns (content hash, json data, error message).
+# If the content hash matches known_hash, the file isn't parsed and the json data is None.
+def read_swimlane_file(json_file_name, known_hash=None):
+    try:
+        with open(json_file_name, 'rb') as file:
+            content = file.read()
+    except OSError as e:
+        return None, None, 'Could not read the ' + json_file_name + ' file: ' + str(e)
+    content_hash = hashlib.sha1(content).hexdigest()
+    if known_hash is not None and content_hash == known_hash:
+        return content_hash, None, None
+    try:
+        return content_hash, parse_json(content), None
+    except ValueError as e:
+        return content_hash, None, 'Could not parse the ' + json_file_name + ' file: ' + str(e)
+
+# Loads many swimlane files at once on a thread pool (or a process pool with use_processes).
+# known_hashes is an optional dictionary of file name -> content hash for files that don't need to be parsed again.
+# Returns (results, errors) where results maps file name -> (content hash, json data) and errors maps file name -> message.
+# A file that can't be read or parsed is reported in errors and left out of results instead of stopping the load.
+def load_swimlane_files(file_names, documentation_dir, max_workers=None, use_processes=False, known_hashes=None):
+    if not known_hashes:
+        known_hashes = {}
+    json_file_names = [os.path.join(documentation_dir, file_name) for file_name in file_names]
+    hashes = [known_hashes.get(file_name) for file_name in file_names]
+    if max_workers is None:
+        max_workers = default_load_workers
+    
+    if max_workers <= 1 or len(file_names) < min_files_for_parallel_load:
+        loaded = map(read_swimlane_file, json_file_names, hashes)
+    else:
+        executor_class = concurrent.futures.ProcessPoolExecutor if use_processes else concurrent.futures.ThreadPoolExecutor
+        with executor_class(max_workers=max_workers) as executor:
+            chunksize = max(1, len(file_names) // (max_workers * 4)) if use_processes else 1
+            loaded = list(executor.map(read_swimlane_file, json_file_names, hashes, chunksize=chunksize))
+    
+    results = {}
+    errors = {}
+    for file_name, (content_hash, json_data, error) in zip(file_names, loaded):
+        if error:
+            errors[file_name] = error
+        else:
+            results[file_name] = (content_hash, json_data)
+    return results, errors
+
+def report_load_errors(errors):
+    for file_name, error in errors.items():
+        logger.warning(error)
+
 # This validates and merges two nodes to build a single, large node dictionary
 def merge_node_values(build_dict, node_dict):
     # Use the existing build_dict and update it with the node_dict values but verify that there are no conflicts
@@ -111,20 +933,68 @@ def merge_node_values(build_dict, node_dict):
     build_dict_freq = build_dict.get('freq', 'u')
     node_dict_freq = node_dict.get('freq', 'u')
     # Update with the node_dict value if it's better
-    if frequency_values.index(node_dict_freq) < frequency_values.index(build_dict_freq):
+    if frequency_codes.get(node_dict_freq, unknown_frequency_code) < frequency_codes.get(build_dict_freq, unknown_frequency_code):
         build_dict['freq'] = node_dict_freq
         
     build_dict_used_by_list = build_dict.get('used_by', [])
     node_dict_used_by_list = node_dict.get('used_by', [])
     
     # Just merge them for now...
+    build_dict_used_by_set = set(build_dict_used_by_list)
     for node_dict_used_by_item in node_dict_used_by_list:
-        if node_dict_used_by_item not in build_dict_used_by_list:
+        if node_dict_used_by_item not in build_dict_used_by_set:
+            build_dict_used_by_set.add(node_dict_used_by_item)
             build_dict_used_by_list.append(node_dict_used_by_item)
             
     build_dict['used_by'] = build_dict_used_by_list
     return build_dict
 
+# Merges every definition of a node in one pass.  definitions is a list of (file name, node dictionary) in build order.
+# The result is the same as merging them one at a time with merge_node_values: the first definition is copied, the
+# used_by lists are combined in order without duplicates and the best freq wins.  Every other value (marker, notes, ...)
+# is kept from the first definition.  If a conflicts list is passed in, a dictionary is added to it for each later
+# definition that has a different value (node, key, kept, kept_file, value, file).  None of the definitions are changed.
+def merge_node_definitions(node_name, definitions, conflicts=None):
+    # An empty definition doesn't count as the first one
+    first_index = 0
+    while first_index < len(definitions) - 1 and not definitions[first_index][1]:
+        first_index += 1
+    first_file, first_dict = definitions[first_index]
+    build_dict = copy_node_dict(first_dict)
+    if first_index == len(definitions) - 1:
+        return build_dict
+    
+    best_freq = build_dict.get('freq', 'u')
+    best_rank = frequency_codes.get(best_freq, unknown_frequency_code)
+    used_by_list = list(normalize_used_by(build_dict.get('used_by', [])))
+    used_by_set = dict.fromkeys(used_by_list)
+    for file_name, node_dict in definitions[first_index + 1:]:
+        for key, value in node_dict.items():
+            if key == 'used_by':
+                for used_by_item in normalize_used_by(value):
+                    if used_by_item not in used_by_set:
+                        used_by_set[used_by_item] = None
+                        used_by_list.append(used_by_item)
+            elif key == 'freq':
+                rank = frequency_codes.get(value, unknown_frequency_code)
+                if rank < best_rank:
+                    best_freq = value
+                    best_rank = rank
+                    build_dict['freq'] = value
+            elif key != 'name' and conflicts is not None and first_dict.get(key) != value:
+                conflicts.append({'node': node_name, 'key': key, 'kept': first_dict.get(key), 'kept_file': first_file,
+                                  'value': value, 'file': file_name})
+    build_dict['used_by'] = used_by_list
+    return build_dict
+
+def report_merge_conflicts(conflicts):
+    if not conflicts:
+        return
+    for conflict in conflicts:
+        logger.debug('%s has %s %r in %s but %r was kept from %s', conflict['node'], conflict['key'], conflict['value'],
+                     conflict['file'], conflict['kept'], conflict['kept_file'])
+    logger.warning('%d node values conflicted while merging.  The first definition of each was kept.', len(conflicts))
+
 # json_nodes are of the form [{}, {}, {}]  The nodes hae to be iterated through.
 def set_colors_and_initial_node_positions(json_nodes):
     pos = {}
@@ -140,20 +1010,106 @@ def set_colors_and_initial_node_positions(json_nodes):
         node_colors[node_name] = color        
     return pos, node_colors
 
+# Occupancy index over a pos dictionary so that conflict checks don't have to scan every position.
+# cell_nodes maps a coordinate to the names placed there and row_xs keeps a sorted list of the distinct
+# x positions used on each row.  Positions should be changed through place() so that pos stays in sync.
+class SwimlaneOccupancyGrid:
+    
+    def __init__(self, pos):
+        self.pos = pos
+        self.cell_nodes = {}
+        self.row_xs = {}
+        # Per column skip pointers for find_free_row.  y -> a higher y where every cell in between was occupied.
+        self.column_skips = {}
+        # Number of occupied cells that find_free_row had to step over (for the instrumentation)
+        self.free_row_steps = 0
+        for node_name, coords in pos.items():
+            self.add_to_cell(node_name, coords)
+    
+    def add_to_cell(self, node_name, coords):
+        names = self.cell_nodes.get(coords)
+        if names is None:
+            self.cell_nodes[coords] = {node_name}
+            (x_pos, y_pos) = coords
+            row = self.row_xs.setdefault(y_pos, [])
+            bisect.insort(row, x_pos)
+        else:
+            names.add(node_name)
+    
+    def remove_from_cell(self, node_name, coords):
+        names = self.cell_nodes.get(coords)
+        if names is None:
+            return
+        names.discard(node_name)
+        if not names:
+            del self.cell_nodes[coords]
+            (x_pos, y_pos) = coords
+            row = self.row_xs[y_pos]
+            del row[bisect.bisect_left(row, x_pos)]
+            if not row:
+                del self.row_xs[y_pos]
+            # A cell opened up so the skip pointers for the column can't be trusted anymore
+            self.column_skips.pop(x_pos, None)
+    
+    def place(self, node_name, coords):
+        current_coords = self.pos.get(node_name)
+        if current_coords == coords:
+            return
+        if current_coords is not None:
+            self.remove_from_cell(node_name, current_coords)
+        self.pos[node_name] = coords
+        self.add_to_cell(node_name, coords)
+    
+    def has_conflict(self, node_name, coords):
+        names = self.cell_nodes.get(coords)
+        if not names:
+            return False
+        return len(names) > 1 or node_name not in names
+    
+    # Is there anything on the row that's strictly between low_x and high_x
+    def has_nodes_between(self, y_pos, low_x, high_x):
+        row = self.row_xs.get(y_pos)
+        if not row:
+            return False
+        i = bisect.bisect_right(row, low_x)
+        return i < len(row) and row[i] < high_x
+    
+    # Returns the first row at or above y_pos where the node can be placed in the x_pos column
+    def find_free_row(self, node_name, x_pos, y_pos=0):
+        skips = self.column_skips.setdefault(x_pos, {})
+        skipped = []
+        free_y = y_pos
+        while self.has_conflict(node_name, (x_pos, free_y)):
+            skipped.append(free_y)
+            free_y = skips.get(free_y, free_y + 1)
+        for skipped_y in skipped:
+            skips[skipped_y] = free_y
+        self.free_row_steps += len(skipped)
+        
+        # The pointers only skip occupied cells, but one of them might be the node's own cell
+        current_coords = self.pos.get(node_name)
+        if current_coords is not None and current_coords[0] == x_pos:
+            current_y = current_coords[1]
+            if y_pos <= current_y < free_y and float(current_y - y_pos).is_integer() \
+                    and not self.has_conflict(node_name, current_coords):
+                free_y = current_y
+        return free_y
+
 def has_conflict(node_name, new_coords, pos):
-    for existing_node, coords in pos.items():
-        if node_name != existing_node and coords == new_coords:
-            return True
-    return False
+    if not isinstance(pos, SwimlaneOccupancyGrid):
+        pos = SwimlaneOccupancyGrid(pos)
+    return pos.has_conflict(node_name, new_coords)
 
 def has_row_conflict(node_name, used_by, node_coords, pos):
+    if not isinstance(pos, SwimlaneOccupancyGrid):
+        pos = SwimlaneOccupancyGrid(pos)
     # Starting with the 'bottom' x_pos, loop through the records and make sure that
     # there isn't a record on that row that's between the current high and low
     (x_pos, y_pos) = node_coords
     current_high_x = None
     # First, look at just its connections to other nodes on the same row.
     for used_by_node_name in used_by:
-        used_by_node_pos = pos[used_by_node_name]
+        used_by_node_pos = pos.pos[used_by_node_name]
         if y_pos == used_by_node_pos[1]:
             if not current_high_x:
                 current_high_x = used_by_node_pos[0]
@@ -163,18 +1119,364 @@ def has_row_conflict(node_name, used_by, node_coords, pos):
             
     # Second, examine other things in the row that might be in the way but only if there was already a current_high_x set for this row.
     if current_high_x:
-        for existing_node, coords in pos.items():
-            if y_pos == coords[1]:
-                coord_x = coords[0]
-                if coord_x > x_pos and coord_x < current_high_x:
-                    return True                
+        if pos.has_nodes_between(y_pos, x_pos, current_high_x):
+            return True
     # Finally check for a regular conflict
-    if has_conflict(node_name, (x_pos, y_pos), pos):
+    if pos.has_conflict(node_name, (x_pos, y_pos)):
         return True    
     # All is well
     return False
 
-def set_positions(pos, max_height, max_width, parent_dict, longest_parent_paths, sorted_parent_paths, base_nodes_and_used_by):
+# Is (x_pos, y_pos) exactly on the line from start_point to end_point.  Floats are ratios of integers, so this is
+# worked out with integer math and there's no rounding for a tall grid or a row like 1.5 to trip over.
+def is_exact_edge_point(start_point, end_point, x_pos, y_pos):
+    (x0, y0) = start_point
+    (x1, y1) = end_point
+    (n0, d0) = float(y0).as_integer_ratio()
+    (n1, d1) = float(y1).as_integer_ratio()
+    (n, d) = float(y_pos).as_integer_ratio()
+    dx = round(x1) - round(x0)
+    return n * d0 * d1 * dx == (n0 * d1 * dx + (n1 * d0 - n0 * d1) * (round(x_pos) - round(x0))) * d
+
+# Every point where the edge from start_point to end_point crosses an integer column strictly between its end points
+# and the y value is exactly a float (nothing can be placed anywhere else on the column).  Like is_exact_edge_point,
+# the y values are worked out with integers and Python's int division rounds correctly, so each float is only kept
+# when it's equal to the exact value.
+def get_edge_crossing_points(start_point, end_point):
+    (x0, y0) = start_point
+    (x1, y1) = end_point
+    x0 = round(x0)
+    x1 = round(x1)
+    if x0 > x1:
+        (x0, y0, x1, y1) = (x1, y1, x0, y0)
+    points = []
+    if x1 - x0 < 2:
+        return points
+    (n0, d0) = float(y0).as_integer_ratio()
+    (n1, d1) = float(y1).as_integer_ratio()
+    dx = x1 - x0
+    # The y at x0 + step is (start + slope * step) / denominator
+    denominator = d0 * d1 * dx
+    start = n0 * d1 * dx
+    slope = n1 * d0 - n0 * d1
+    for step in range(1, dx):
+        numerator = start + slope * step
+        y_pos = numerator / denominator
+        (n, d) = y_pos.as_integer_ratio()
+        if n * denominator == numerator * d:
+            points.append((x0 + step, y_pos))
+    return points
+
+# Finds every placed node that an edge passes through (not counting the edge's own end points).
+# edges is a list of (source name, target name).  Returns a list of (edge index, node name) ordered by edge.
+# The result is exact (see is_exact_edge_point) however tall the grid is.
+def find_edge_collisions(pos, edges):
+    placed_names = [node_name for node_name, (x_pos, y_pos) in pos.items() if x_pos >= 0]
+    edges = [(i, pos[source], pos[target]) for i, (source, target) in enumerate(edges)
+             if source in pos and target in pos and pos[source][0] >= 0 and pos[target][0] >= 0]
+    if not placed_names or not edges:
+        return []
+    if np is None:
+        return find_edge_collisions_without_numpy(pos, placed_names, edges)
+    
+    # Spatial index of the node positions as a sorted array of (x, y) keys.  Rows are numbered by their rank among
+    # the y values that are used so that the keys are exact integers.
+    node_x = np.rint(np.array([pos[node_name][0] for node_name in placed_names], dtype=float)).astype(np.int64)
+    node_y = np.array([pos[node_name][1] for node_name in placed_names], dtype=float)
+    row_values = np.unique(node_y)
+    row_stride = len(row_values) + 1
+    node_keys = node_x * row_stride + np.searchsorted(row_values, node_y)
+    node_order = np.argsort(node_keys, kind='stable')
+    sorted_keys = node_keys[node_order]
+    
+    edge_index = np.array([i for i, start, end in edges], dtype=np.int64)
+    x0 = np.rint(np.array([start[0] for i, start, end in edges], dtype=float)).astype(np.int64)
+    y0 = np.array([start[1] for i, start, end in edges], dtype=float)
+    x1 = np.rint(np.array([end[0] for i, start, end in edges], dtype=float)).astype(np.int64)
+    y1 = np.array([end[1] for i, start, end in edges], dtype=float)
+    
+    # Sloped edges: look up the point on the line at every integer x between the end points.  The float y can be a
+    # few ulps away from the exact one, so every node within a margin well past that is found and checked exactly below.
+    sloped = x0 != x1
+    dx = np.abs(x1 - x0)
+    counts = np.where(sloped, np.maximum(dx - 1, 0), 0)
+    point_edges = np.repeat(np.arange(len(edges)), counts)
+    offsets = np.arange(len(point_edges)) - np.repeat(np.cumsum(counts) - counts, counts)
+    point_x = np.minimum(x0, x1)[point_edges] + 1 + offsets
+    point_y = y0[point_edges] + (y1 - y0)[point_edges] * (point_x - x0[point_edges]) / (x1 - x0)[point_edges]
+    margin = 64 * np.spacing(np.maximum(np.abs(y0), np.abs(y1)))[point_edges]
+    low = np.searchsorted(sorted_keys, point_x * row_stride + np.searchsorted(row_values, point_y - margin, side='left'), side='left')
+    high = np.searchsorted(sorted_keys, point_x * row_stride + np.searchsorted(row_values, point_y + margin, side='right'), side='left')
+    
+    # Vertical edges: everything in the column strictly between the end points
+    vertical = np.flatnonzero(~sloped)
+    low_rank = np.searchsorted(row_values, np.minimum(y0, y1)[vertical], side='right')
+    high_rank = np.searchsorted(row_values, np.maximum(y0, y1)[vertical], side='left')
+    vertical_low = np.searchsorted(sorted_keys, x0[vertical] * row_stride + low_rank, side='left')
+    vertical_high = np.maximum(np.searchsorted(sorted_keys, x0[vertical] * row_stride + high_rank, side='left'), vertical_low)
+    
+    # Expand each [low, high) range of the sorted keys into the individual hits
+    sloped_hit_count = int((high - low).sum())
+    low = np.concatenate([low, vertical_low])
+    high = np.concatenate([high, vertical_high])
+    hit_edges = np.concatenate([point_edges, vertical])
+    hit_counts = high - low
+    hit_edges = np.repeat(hit_edges, hit_counts)
+    hit_positions = np.repeat(low, hit_counts) + np.arange(len(hit_edges)) - np.repeat(np.cumsum(hit_counts) - hit_counts, hit_counts)
+    hit_nodes = node_order[hit_positions]
+    
+    keep = np.ones(len(hit_edges), dtype=bool)
+    for i in range(sloped_hit_count):
+        (j, start, end) = edges[hit_edges[i]]
+        node_coords = pos[placed_names[hit_nodes[i]]]
+        keep[i] = is_exact_edge_point(start, end, node_coords[0], node_coords[1])
+    hit_edges = hit_edges[keep]
+    hit_nodes = hit_nodes[keep]
+    
+    order = np.argsort(edge_index[hit_edges], kind='stable')
+    return [(int(edge_index[hit_edges[i]]), placed_names[hit_nodes[i]]) for i in order]
+
+# Same as find_edge_collisions for when NumPy isn't installed
+def find_edge_collisions_without_numpy(pos, placed_names, edges):
+    cells = {}
+    column_nodes = {}
+    for node_name in placed_names:
+        (x_pos, y_pos) = pos[node_name]
+        x_pos = round(x_pos)
+        cells.setdefault((x_pos, y_pos), []).append(node_name)
+        column_nodes.setdefault(x_pos, []).append((y_pos, node_name))
+    # Sorted y values for each column along with the matching names
+    columns = {}
+    for x_pos, nodes in column_nodes.items():
+        nodes.sort(key=lambda node: node[0])
+        columns[x_pos] = ([y_pos for y_pos, node_name in nodes], [node_name for y_pos, node_name in nodes])
+    
+    collisions = []
+    for i, start, end in edges:
+        x0 = round(start[0])
+        if x0 == round(end[0]):
+            if x0 not in columns:
+                continue
+            (column_ys, column_names) = columns[x0]
+            start_index = bisect.bisect_right(column_ys, min(start[1], end[1]))
+            end_index = max(bisect.bisect_left(column_ys, max(start[1], end[1])), start_index)
+            for node_name in column_names[start_index:end_index]:
+                collisions.append((i, node_name))
+        else:
+            for point in get_edge_crossing_points(start, end):
+                for node_name in cells.get(point, []):
+                    collisions.append((i, node_name))
+    return collisions
+
+# A node that's in the way of an edge (or one of the edge's end points) only looks this many rows past where it is for
+# a free row.  In a crowded column the next free row can be far away and looking for it is what takes the time.
+max_edge_collision_row_steps = 256
+# The moves stop after this many seconds (None for no limit) and whatever has been done so far is kept
+default_edge_collision_seconds = 2.0
+
+# Keeps track of the edge collisions while relocate_edge_collisions moves nodes around so that a move can be scored
+# without looking at every edge again.  crossings counts the sloped edges through each point (see
+# get_edge_crossing_points), vertical_edges has the (low y, high y) of the edges in each column and column_ys has the
+# sorted y values of the nodes in each column.
+class SwimlaneEdgeCollisionIndex:
+    
+    def __init__(self, grid, edges):
+        self.grid = grid
+        self.edges = edges
+        # node name -> indexes of its edges
+        self.node_edges = {}
+        self.edge_points = {}
+        self.crossings = {}
+        self.vertical_edges = {}
+        self.column_ys = {}
+        for node_name, (x_pos, y_pos) in grid.pos.items():
+            if x_pos >= 0:
+                bisect.insort(self.column_ys.setdefault(round(x_pos), []), y_pos)
+        for edge_index, (source, target) in enumerate(edges):
+            if source == target or source not in grid.pos or target not in grid.pos or grid.pos[source][0] < 0 or grid.pos[target][0] < 0:
+                continue
+            self.node_edges.setdefault(source, []).append(edge_index)
+            self.node_edges.setdefault(target, []).append(edge_index)
+            self.add_edge(edge_index)
+    
+    # The end points of an edge with node_name at coords instead of where it is
+    def get_edge_coords(self, edge_index, node_name=None, coords=None):
+        (source, target) = self.edges[edge_index]
+        start = coords if source == node_name else self.grid.pos[source]
+        end = coords if target == node_name else self.grid.pos[target]
+        return start, end
+    
+    def add_edge(self, edge_index):
+        (start, end) = self.get_edge_coords(edge_index)
+        if round(start[0]) == round(end[0]):
+            self.vertical_edges.setdefault(round(start[0]), {})[edge_index] = (min(start[1], end[1]), max(start[1], end[1]))
+        else:
+            points = self.edge_points[edge_index] = get_edge_crossing_points(start, end)
+            for point in points:
+                self.crossings[point] = self.crossings.get(point, 0) + 1
+    
+    def remove_edge(self, edge_index):
+        points = self.edge_points.pop(edge_index, None)
+        if points is None:
+            (start, end) = self.get_edge_coords(edge_index)
+            del self.vertical_edges[round(start[0])][edge_index]
+            return
+        for point in points:
+            count = self.crossings[point] - 1
+            if count:
+                self.crossings[point] = count
+            else:
+                del self.crossings[point]
+    
+    # Number of nodes that an edge from start to end would pass through
+    def count_edge_nodes(self, start, end):
+        if round(start[0]) == round(end[0]):
+            column_ys = self.column_ys.get(round(start[0]))
+            if not column_ys:
+                return 0
+            return max(bisect.bisect_left(column_ys, max(start[1], end[1])) - bisect.bisect_right(column_ys, min(start[1], end[1])), 0)
+        count = 0
+        for point in get_edge_crossing_points(start, end):
+            names = self.grid.cell_nodes.get(point)
+            if names:
+                count += len(names)
+        return count
+    
+    # Number of edges that pass through coords
+    def count_cell_edges(self, coords):
+        (x_pos, y_pos) = coords
+        count = self.crossings.get(coords, 0)
+        for low_y, high_y in self.vertical_edges.get(round(x_pos), {}).values():
+            if low_y < y_pos < high_y:
+                count += 1
+        return count
+    
+    # The collisions that node_name is part of if it's at coords (with it and its edges taken out of the index)
+    def get_node_collisions(self, node_name, coords):
+        count = self.count_cell_edges(coords)
+        for edge_index in self.node_edges.get(node_name, []):
+            (start, end) = self.get_edge_coords(edge_index, node_name, coords)
+            count += self.count_edge_nodes(start, end)
+        return count
+    
+    # The columns that node_name can move to: its own and the ones next to it, as long as none of its edges would end
+    # up going backwards
+    def get_node_columns(self, node_name):
+        x_pos = self.grid.pos[node_name][0]
+        low_x = 0
+        high_x = None
+        for edge_index in self.node_edges.get(node_name, []):
+            (source, target) = self.edges[edge_index]
+            if source == node_name:
+                target_x = self.grid.pos[target][0]
+                if target_x >= x_pos and (high_x is None or target_x < high_x):
+                    high_x = target_x
+            else:
+                source_x = self.grid.pos[source][0]
+                if source_x <= x_pos and source_x > low_x:
+                    low_x = source_x
+        return [column for column in (x_pos, x_pos - 1, x_pos + 1) if column >= low_x and (high_x is None or column <= high_x)]
+    
+    # Moves node_name to the free spot in its own or a neighbouring column (a row below, the same row or a row above,
+    # or the next free row past those within max_row_steps) that's part of the fewest collisions.  It only moves
+    # if that's fewer than where it is.  Returns the change in the number of collisions (0 or less).
+    def relocate(self, node_name, max_row_steps=max_edge_collision_row_steps):
+        coords = self.grid.pos[node_name]
+        node_edges = self.node_edges.get(node_name, [])
+        for edge_index in node_edges:
+            self.remove_edge(edge_index)
+        self.grid.remove_from_cell(node_name, coords)
+        column_ys = self.column_ys[round(coords[0])]
+        del column_ys[bisect.bisect_left(column_ys, coords[1])]
+        
+        current_count = best_count = self.get_node_collisions(node_name, coords)
+        best_coords = coords
+        tried = {coords}
+        for x_pos in self.get_node_columns(node_name):
+            for start_y in (coords[1] - 1, coords[1], coords[1] + 1):
+                if start_y < 0:
+                    continue
+                y_pos = self.grid.find_free_row(node_name, x_pos, start_y)
+                if y_pos - start_y > max_row_steps or (x_pos, y_pos) in tried:
+                    continue
+                tried.add((x_pos, y_pos))
+                count = self.get_node_collisions(node_name, (x_pos, y_pos))
+                if count < best_count:
+                    best_count = count
+                    best_coords = (x_pos, y_pos)
+        
+        self.grid.add_to_cell(node_name, coords)
+        self.grid.place(node_name, best_coords)
+        bisect.insort(self.column_ys.setdefault(round(best_coords[0]), []), best_coords[1])
+        for edge_index in node_edges:
+            self.add_edge(edge_index)
+        return best_count - current_count
+
+# Moves nodes so that fewer edges pass through other nodes.  The edges with the most nodes in the way go first and
+# their end points are moved, while for edges with up to max_nodes_per_edge nodes in the way, those nodes are tried
+# before the end points.  Each node goes to whichever free spot in its own or a neighbouring column is part of the
+# fewest collisions (see SwimlaneEdgeCollisionIndex.relocate) and only if that's fewer than before, so the count
+# never goes up.  A node is only moved to a neighbouring column if none of its edges end up going backwards.  This
+# repeats until nothing collides, max_passes is reached, a pass can't move anything or max_seconds have gone by.
+# Returns the number of moves.
+# If a stats dictionary is passed in, it's filled in with the number of collisions before and after along with the
+# passes, the nodes that had nowhere better to go and whether it ran out of time.
+def relocate_edge_collisions(grid, edges, max_passes=3, max_nodes_per_edge=2, max_row_steps=max_edge_collision_row_steps,
+                             max_seconds=default_edge_collision_seconds, stats=None):
+    deadline = None if max_seconds is None else time.perf_counter() + max_seconds
+    timed_out = False
+    moved_count = 0
+    skipped_count = 0
+    pass_count = 0
+    collisions = find_edge_collisions(grid.pos, edges)
+    first_count = len(collisions)
+    index = SwimlaneEdgeCollisionIndex(grid, edges) if collisions else None
+    for pass_number in range(max_passes):
+        if not collisions or timed_out:
+            break
+        pass_count += 1
+        
+        edge_collision_counts = {}
+        for edge_index, node_name in collisions:
+            edge_collision_counts[edge_index] = edge_collision_counts.get(edge_index, 0) + 1
+        collisions.sort(key=lambda collision: -edge_collision_counts[collision[0]])
+        candidate_names = []
+        for edge_index, node_name in collisions:
+            if edge_collision_counts[edge_index] <= max_nodes_per_edge:
+                candidate_names.append(node_name)
+            candidate_names.extend(edges[edge_index])
+        
+        pass_moves = 0
+        tried_names = set()
+        for node_name in candidate_names:
+            if node_name in tried_names:
+                continue
+            if deadline is not None and time.perf_counter() > deadline:
+                timed_out = True
+                break
+            tried_names.add(node_name)
+            if index.relocate(node_name, max_row_steps) < 0:
+                pass_moves += 1
+            else:
+                skipped_count += 1
+        moved_count += pass_moves
+        collisions = find_edge_collisions(grid.pos, edges)
+        if not pass_moves:
+            # Nothing could be moved, so another pass wouldn't change anything
+            break
+    
+    if first_count and len(collisions) >= first_count:
+        logger.info('Resolving the edge collisions left all %d of them in place', first_count)
+    if stats is not None:
+        stats['edge_collisions_before'] = first_count
+        stats['edge_collisions_after'] = len(collisions)
+        stats['edge_collision_passes'] = pass_count
+        stats['edge_collision_skips'] = skipped_count
+        stats['edge_collision_timed_out'] = timed_out
+    return moved_count
+
+# If a stats dictionary is passed in, it's filled in with how much work the conflict loops did
+def set_positions(pos, max_height, max_width, parent_dict, longest_parent_paths, sorted_parent_paths, base_nodes_and_used_by, resolve_edge_collisions=False, max_collision_passes=3, stats=None):
     # Work through the parent nodes from longest to shortest
 #     print('SETTING POSITONS...')
 #     print('\nmax_height:', max_height)
@@ -184,6 +1486,8 @@ def set_positions(pos, max_height, max_width, parent_dict, longest_parent_paths,
 #     print('sorted_parent_paths:', sorted_parent_paths)
 #     print('Initial positions:', pos)
     base_node_keys = base_nodes_and_used_by.keys()
+    # All of the position updates go through the grid so that conflict checks don't have to scan pos
+    grid = SwimlaneOccupancyGrid(pos)
     parent_node_positions = calculate_node_positions(max_height,len(sorted_parent_paths))
 #     print('\nparent_node_positons:', parent_node_positons)
     for i, parent_node in enumerate(sorted_parent_paths):
@@ -193,7 +1497,7 @@ def set_positions(pos, max_height, max_width, parent_dict, longest_parent_paths,
             current_node = pos[node_name]
             if current_node[0] < 0:
                 # It can be set
-                pos[node_name] = (max_width-j-1, parent_node_positions[i])
+                grid.place(node_name, (max_width-j-1, parent_node_positions[i]))
     
     # Now that the initial settings have been done for the longest path of each parent, examine the nodes that haven't been set
     for node_name in pos:
@@ -208,111 +1512,319 @@ def set_positions(pos, max_height, max_width, parent_dict, longest_parent_paths,
                 x_pos = 0
             else:
                 x_pos = get_x_pos_from_lowest_parent(pos, max_width, parent_names)                
-            y_pos = 0
-            while has_conflict(node_name, (x_pos, y_pos), pos):
-                y_pos += 1
+            y_pos = grid.find_free_row(node_name, x_pos)
                 
-            print('Setting', node_name, 'to', x_pos, y_pos)
-            pos[node_name] = (x_pos, y_pos)
+            logger.debug('Setting %s to %s %s', node_name, x_pos, y_pos)
+            grid.place(node_name, (x_pos, y_pos))
     
     # Now, examine all fo the nodes that aren't used by anything (base_node_names) to see if their connections are all on the same row.
+    row_conflict_iterations = 0
     for node_name in base_node_keys:
         (x_pos, y_pos) = pos[node_name]
         used_by = base_nodes_and_used_by[node_name]
-        while has_row_conflict(node_name, used_by, (x_pos, y_pos), pos):
+        while has_row_conflict(node_name, used_by, (x_pos, y_pos), grid):
             y_pos += 1
+            row_conflict_iterations += 1
             
-        pos[node_name] = (x_pos, y_pos)
+        grid.place(node_name, (x_pos, y_pos))
         
-    # TODO: Finally, we want to examine all of the integer node location that the vectors 
-    # travel through and see if they pass through any assigned node positions (and how many).
-    # If they pass through too many, move the offending node.  Otherwise, move the node that they pass through.
-    # Loop through every node and determine the exact nodes that it traverses through.    
-    
+    # Finally, examine all of the node locations that the vectors travel through and see if they pass through any
+    # assigned node positions (and how many).  If they pass through too many, move the offending node.
+    # Otherwise, move the node that they pass through.
+    edge_collision_moves = 0
+    if resolve_edge_collisions:
+        edges = [(node_name, used_by_name) for node_name, used_by in parent_dict.items() for used_by_name in used_by]
+        edge_collision_moves = relocate_edge_collisions(grid, edges, max_passes=max_collision_passes, stats=stats)
     
+    if stats is not None:
+        stats['free_row_steps'] = grid.free_row_steps
+        stats['row_conflict_iterations'] = row_conflict_iterations
+        stats['edge_collision_moves'] = edge_collision_moves
 #     print('FINAL POSITIONS:', pos)
     return pos
 
-def build_json_nodes(swimlane_files, documentation_dir):
-    if not swimlane_files:
-        # Build the list
-        swimlane_files = []
+# Returns the (node name, used_by name) edges where the node isn't left of the node that uses it.  Edges inside a cycle
+# don't count.  With node_names, only the edges to and from those nodes are checked.
+def find_backward_edges(pos, json_nodes, node_names=None, graph_index=None, component=None):
+    if graph_index is None:
+        graph_index = SwimlaneGraphIndex(json_nodes)
+    if component is None:
+        component = find_strongly_connected_components(graph_index.children)[0]
+    names = graph_index.names
+    if node_names is None:
+        edges = [(node_id, used_by_id) for node_id in range(graph_index.node_count) for used_by_id in graph_index.used_by[node_id]]
+    else:
+        edges = set()
+        for node_name in node_names:
+            node_id = graph_index.get_id(node_name)
+            if node_id is None or node_id >= graph_index.node_count:
+                continue
+            edges.update((node_id, used_by_id) for used_by_id in graph_index.used_by[node_id])
+            edges.update((child_id, node_id) for child_id in graph_index.children[node_id] if child_id < graph_index.node_count)
+    backward_edges = []
+    for node_id, used_by_id in edges:
+        node_coords = pos.get(names[node_id])
+        used_by_coords = pos.get(names[used_by_id])
+        if node_coords is not None and used_by_coords is not None and component[used_by_id] != component[node_id] \
+                and node_coords[0] >= used_by_coords[0]:
+            backward_edges.append((names[node_id], names[used_by_id]))
+    return backward_edges
+
+# Incremental version of set_positions for when a few nodes have been added, removed or changed.  pos holds the
+# positions from an earlier layout for the nodes that are still in json_nodes and changed_names are the nodes that were
+# added or changed.  Nodes that are still in a valid spot (left of the nodes that use them, outside of cycles, and in a
+# cell of their own) keep their positions.  Everything else is placed one column left of the leftmost node that uses
+# it, working from the final nodes back to the base nodes so that every node is only placed once.  Moving a node left
+# past the edge of the layout shifts everything over instead.  The edge collisions aren't resolved again since that
+# would move nodes that haven't changed.  removed_names are the nodes that were removed.  What fed them is checked as
+# well since taking a node out can break a cycle.  If an edge to or from a node that was checked still doesn't point
+# right afterwards, everything is laid out again with set_positions.  Returns pos along with the max_width and
+# max_height for the labels.
+def update_node_positions(pos, json_nodes, changed_names, removed_names=None, stats=None):
+    if not pos:
+        # Nothing to keep, so just lay it all out
+        return layout_node_positions(json_nodes, stats=stats)
+    
+    graph_index = SwimlaneGraphIndex(json_nodes)
+    component = find_strongly_connected_components(graph_index.children)[0]
+    names = graph_index.names
+    base_node_names = set(graph_index.get_base_node_names())
+    max_width = max(x_pos for (x_pos, y_pos) in pos.values()) + 1
+    grid = SwimlaneOccupancyGrid(pos)
+    
+    # Components come after everything that they use, so the highest component goes first
+    queue = []
+    queued = set()
+    
+    def push(node_id):
+        if node_id < graph_index.node_count and node_id not in queued:
+            queued.add(node_id)
+            heapq.heappush(queue, (-component[node_id], node_id))
+    
+    for node_name in changed_names:
+        node_id = graph_index.get_id(node_name)
+        if node_id is not None:
+            push(node_id)
+    for node_name in removed_names or []:
+        # A removed node is still known if something lists it in used_by
+        node_id = graph_index.get_id(node_name)
+        if node_id is not None:
+            for child_id in graph_index.children[node_id]:
+                push(child_id)
+    
+    moved_names = []
+    shift_count = 0
+    while queue:
+        node_id = heapq.heappop(queue)[1]
+        node_name = names[node_id]
+        # Anything that isn't described by a node can't be placed
+        used_by = [used_by_name for used_by_name in graph_index.get_used_by(node_name) if used_by_name in pos]
+        outside_used_by = [used_by_name for used_by_name in used_by if component[graph_index.get_id(used_by_name)] != component[node_id]]
+        is_base_node = node_name in base_node_names
         
-        for file in os.listdir(documentation_dir):
-            if file.endswith('.json'):
-                swimlane_files.append(file)
+        current_coords = pos.get(node_name)
+        if current_coords is not None:
+            (x_pos, y_pos) = current_coords
+            is_valid = all(x_pos < pos[used_by_name][0] for used_by_name in outside_used_by) and not grid.has_conflict(node_name, current_coords)
+            if is_valid and is_base_node:
+                is_valid = not has_row_conflict(node_name, used_by, current_coords, grid)
+            if is_valid:
+                # It stays, but what feeds it might not be on its left anymore (e.g. when a cycle was broken)
+                for child_id in graph_index.children[node_id]:
+                    child_coords = pos.get(names[child_id])
+                    if component[child_id] != component[node_id] and child_coords is not None and child_coords[0] >= x_pos:
+                        push(child_id)
+                continue
         
-        # Cleanup the file names
-        build_files = []
-        for file in swimlane_files:
-            if not file.endswith('.json'):
-                file += '.json'
-            build_files.append(file)
+        if not used_by:
+            # Final nodes start their own path in the last column
+            x_pos = max_width - 1
+        else:
+            # Same as get_x_pos_from_lowest_parent, but pos only has placed nodes so a parent in column 0 counts too.
+            # Base nodes go there as well rather than in column 0 since what they feed might already be in column 0.
+            x_pos = min(pos[used_by_name][0] for used_by_name in (outside_used_by or used_by)) - 1
+        if x_pos < 0:
+            # Make room on the left
+            shift = -x_pos
+            for shifted_name, (shifted_x, shifted_y) in list(pos.items()):
+                grid.place(shifted_name, (shifted_x + shift, shifted_y))
+            grid.column_skips = {}
+            max_width += shift
+            x_pos = 0
+            shift_count += 1
         
-    build_dictionary = {}
-    for build_file in build_files:
-        # Load a file
-#         print(''Loading file, build_file)
-        json_data = load_swimlane_file(build_file, documentation_dir)
-#         formatted_nodes = json.dumps(json_data, indent=2)
-#         print(formatted_nodes)
-        swimlane_nodes = json_data['swimlane_nodes']
-        for key in swimlane_nodes.keys():
-            node_dict = swimlane_nodes[key]
-            build_dict = build_dictionary.get(key, None)
-            if not build_dict:
-                build_dictionary[key] = node_dict
-            else:
-                # Need to merge them
-                build_dictionary[key] = merge_node_values(build_dict, node_dict)
+        # Stay on the same row if there's room there
+        if current_coords is not None and not grid.has_conflict(node_name, (x_pos, current_coords[1])):
+            y_pos = current_coords[1]
+        else:
+            y_pos = grid.find_free_row(node_name, x_pos)
+        if is_base_node:
+            while has_row_conflict(node_name, used_by, (x_pos, y_pos), grid):
+                y_pos += 1
+        grid.place(node_name, (x_pos, y_pos))
+        moved_names.append(node_name)
+        
+        # The nodes that feed this one might be out of place now
+        for child_id in graph_index.children[node_id]:
+            push(child_id)
+    
+    # Only the nodes that were checked are looked at again since set_positions doesn't promise that every edge points
+    # right either
+    backward_edges = find_backward_edges(pos, json_nodes, [names[node_id] for node_id in queued], graph_index, component)
+    if stats is not None:
+        stats['checked_count'] = len(queued)
+        stats['moved_count'] = len(moved_names)
+        stats['shift_count'] = shift_count
+        stats['free_row_steps'] = grid.free_row_steps
+        stats['backward_edge_count'] = len(backward_edges)
+    if backward_edges:
+        logger.warning('%d edges (e.g. %s -> %s) point left after the incremental layout, so everything is being laid out again',
+                       len(backward_edges), backward_edges[0][0], backward_edges[0][1])
+        return layout_node_positions(json_nodes, stats=stats)
+    return pos, max_width, len(base_node_names)
+
+# Lays out all of the json nodes with set_positions.  Returns pos along with the max_width and max_height for the labels.
+def layout_node_positions(json_nodes, stats=None):
+    initial_pos, node_colors = set_colors_and_initial_node_positions(json_nodes)
+    layout_inputs = get_layout_inputs(json_nodes)
+    pos = set_positions(initial_pos, stats=stats, **layout_inputs)
+    return pos, layout_inputs['max_width'], layout_inputs['max_height']
+
+# Returns the names of all of the swimlane files in the documentation directory
+def get_swimlane_file_names(documentation_dir):
+    swimlane_files = []
+    with os.scandir(documentation_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file():
+                swimlane_files.append(entry.name)
+    return swimlane_files
+
+# Cleanup the file names
+def normalize_swimlane_file_names(swimlane_files):
+    build_files = []
+    for file in swimlane_files:
+        if not file.endswith('.json'):
+            file += '.json'
+        build_files.append(file)
+    return build_files
+
+# Copies a node dictionary along with its used_by list so that the copy can be merged into
+def copy_node_dict(node_dict):
+    node_copy = dict(node_dict)
+    if isinstance(node_copy.get('used_by'), list):
+        node_copy['used_by'] = list(node_copy['used_by'])
+    return node_copy
+
+# Compares two lists of json nodes by name.  Returns the added nodes, the removed names and the modified nodes.
+def diff_json_nodes(old_json_nodes, new_json_nodes):
+    old_nodes_by_name = {node['name']: node for node in old_json_nodes}
+    added = []
+    modified = []
+    for node in new_json_nodes:
+        old_node = old_nodes_by_name.pop(node['name'], None)
+        if old_node is None:
+            added.append(node)
+        elif old_node != node:
+            modified.append(node)
+    return added, list(old_nodes_by_name), modified
+
+# Returns a new list of json nodes with the changes applied.  modified (and added) nodes replace the node with the same
+# name where it is in the list and anything new goes at the end.  The nodes that didn't change aren't copied.
+def apply_json_node_changes(json_nodes, added=None, removed=None, modified=None):
+    replacements = {}
+    for node in list(modified or []) + list(added or []):
+        if 'name' not in node:
+            raise Exception('Every added or modified node needs a name!')
+        replacements[node['name']] = copy_node_dict(node)
+    removed_names = set(removed or [])
+    
+    new_json_nodes = []
+    for node in json_nodes:
+        node_name = node['name']
+        if node_name in removed_names:
+            continue
+        new_json_nodes.append(replacements.pop(node_name, node))
+    new_json_nodes.extend(replacements.values())
+    return new_json_nodes
+
+# Updates a DiGraph from get_initialized_DiGraph in place so that it matches the changed json nodes.  node_names are
+# the names of all of the json nodes after the changes.  Like get_initialized_DiGraph, names that are only used in
+# used_by lists stay in the graph for as long as something points at them.
+def apply_graph_changes(graph, node_names, added=None, removed=None, modified=None):
+    changed_nodes = list(modified or []) + list(added or [])
+    old_targets = set()
+    for node_name in [node['name'] for node in changed_nodes] + list(removed or []):
+        if node_name in graph:
+            out_edges = list(graph.out_edges(node_name))
+            old_targets.update(target for source, target in out_edges)
+            graph.remove_edges_from(out_edges)
+    
+    for node_name in removed or []:
+        if node_name in graph and node_name not in node_names and graph.in_degree(node_name) == 0:
+            graph.remove_node(node_name)
+    
+    for node in changed_nodes:
+        graph.add_node(node['name'])
+        graph.add_edges_from((node['name'], target) for target in normalize_used_by(node.get('used_by', [])))
+    
+    # Drop the names that nothing points at anymore
+    for target in old_targets:
+        if target in graph and target not in node_names and graph.degree(target) == 0:
+            graph.remove_node(target)
+    return graph
 
-        formatted_nodes = json.dumps(build_dictionary, indent=2)
-#         print('\n\nMERGED BUILD DICTIONARY:', formatted_nodes)
+# Merges the swimlane_nodes of the loaded files.  loaded_files is a list of (file name, json data) in build order.
+def merge_swimlane_nodes(loaded_files, conflicts=None):
+    # Gather every definition of each node first so that each node is merged once (see merge_node_definitions)
+    node_definitions = {}
+    for build_file, json_data in loaded_files:
+        for key, node_dict in json_data.get('swimlane_nodes', {}).items():
+            definitions = node_definitions.get(key)
+            if definitions is None:
+                node_definitions[key] = [(build_file, node_dict)]
+            else:
+                definitions.append((build_file, node_dict))
     
     # Finally, convert it to the previous array of dictionaries format
     json_nodes = []
-    for key in build_dictionary.keys():
-        dict_value = build_dictionary[key]
+    for key, definitions in node_definitions.items():
+        dict_value = merge_node_definitions(key, definitions, conflicts)
         # Add the name from the key
         dict_value['name'] = key
         json_nodes.append(dict_value)
-    
-    formatted_json_nodes = json.dumps(json_nodes, indent=2)
-#     print('\n\nFINAL JSON NODES:', formatted_json_nodes)
     return json_nodes
 
-def build_json_nodes_for_notebook(swimlane_files, documentation_dir):
-    append_to_build_files = False    
+def build_json_nodes(swimlane_files, documentation_dir):
     if not swimlane_files:
-        append_to_build_files = True
-        swimlane_files = []
-        
-    build_files = []
-    # Build files are defined by the swimlane_files if they exist
-    for file in swimlane_files:
-        if not file.endswith('.json'):
-            file += '.json'
-        build_files.append(file)
-    
-    all_notebook_files = []
-    for file in os.listdir(documentation_dir):
-        if file.endswith('.json'):
-            all_notebook_files.append(file)
-            # Build files are comprised of all .json files in the directory if they haven't been defined by the swimlane_files variable
-            if append_to_build_files:
-                build_files.append(file)
+        # Build the list
+        swimlane_files = get_swimlane_file_names(documentation_dir)
+    build_files = normalize_swimlane_file_names(swimlane_files)
     
-    # Now that you have the file names for all of the files in the directory and the ones for notebooks that you care about, process them.
+    results, errors = load_swimlane_files(build_files, documentation_dir)
+    report_load_errors(errors)
+    conflicts = []
+    json_nodes = merge_swimlane_nodes([(build_file, results[build_file][1]) for build_file in build_files if build_file in results], conflicts)
+    report_merge_conflicts(conflicts)
+    return json_nodes
+
+# Builds the notebook nodes from all of the loaded files.  loaded_files is a list of (file name, json data).
+# The parts of a loaded swimlane file that the notebook nodes and the run times need: the notebook's own values (see
+# notebook_keys) and the names of the nodes that it describes
+def summarize_swimlane_file(json_data):
+    summary = {notebook_key: json_data[notebook_key] for notebook_key in notebook_keys if notebook_key in json_data}
+    summary['node_names'] = list(json_data.get('swimlane_nodes', {}))
+    return summary
+
+def merge_notebook_nodes(loaded_files):
     build_dictionary = {}
-    for filename in all_notebook_files:
-        # Load all of the files
-        json_data = load_swimlane_file(filename, documentation_dir)
+    for filename, json_data in loaded_files:
         key = filename.replace('.json', '')
         
         if not key:
             raise Exception('The ' + filename + ' file does not have a name set.')
         
-        node_dict = {notebook_key: json_data[notebook_key] for notebook_key in notebook_keys if notebook_key in json_data}
+        # Copy it so that the used_by list isn't shared with the loaded data since it may be merged into
+        node_dict = copy_node_dict({notebook_key: json_data[notebook_key] for notebook_key in notebook_keys if notebook_key in json_data})
         build_dict = build_dictionary.get('name', None)
         
         # The notebook version is a little different such that it can reference top-level items that aren't described anywhere.
@@ -338,77 +1850,573 @@ def build_json_nodes_for_notebook(swimlane_files, documentation_dir):
         # Add the name from the key
         dict_value['name'] = key
         json_nodes.append(dict_value)
-    
-    formatted_json_nodes = json.dumps(json_nodes, indent=2)
-#     print('\n\nFINAL JSON NOTEBOOK NODES:', formatted_json_nodes)
     return json_nodes
 
-def set_final_node_and_label_positions(pos, json_nodes):
-    label_pos = {}
-    child_dict = {}
-    parent_dict = {}
-    longest_parent_paths = {}
+def build_json_nodes_for_notebook(swimlane_files, documentation_dir):
+    # All of the files in the directory are processed for the notebook nodes
+    all_notebook_files = get_swimlane_file_names(documentation_dir)
     
-    # Get the list of all names
-    all_node_names = [node['name'] for node in json_nodes]
-    # Get the list of all nodes that are 'used_by' another node
-    names_of_nodes_using_another_node = set()
-    for node in json_nodes:
-        used_by_list = node.get('used_by', [])
+    results, errors = load_swimlane_files(all_notebook_files, documentation_dir)
+    report_load_errors(errors)
+    return merge_notebook_nodes([(filename, results[filename][1]) for filename in all_notebook_files if filename in results])
+
+# Version of the build cache format.  Bump this whenever the cached data or the merge rules change.
+build_cache_version = 3
+
+# Persistent cache of the parsed swimlane files and the merged nodes that is kept under documentation_dir/.cache.
+# It's plain JSON (never pickle) since documentation directories are often shared and anyone who can write to the
+# cache could otherwise run code in every build that reads it.
+# Files are only re-read when their mtime or size changes and only re-parsed when their content hash changes.
+# Merged nodes are only re-merged when one of the files that they come from has changed.
+# With persistent=False, the cache is only kept in memory.
+class SwimlaneBuildCache:
+    
+    def __init__(self, documentation_dir, cache_dir=None, persistent=True):
+        self.documentation_dir = documentation_dir
+        self.persistent = persistent
+        self.cache_dir = cache_dir if cache_dir else os.path.join(documentation_dir, '.cache')
+        self.cache_file_name = os.path.join(self.cache_dir, 'build_cache.json')
+        # file name -> {'mtime_ns', 'size', 'hash', 'json_data'}
+        self.files = {}
+        # node name -> (((file name, hash), ...), merged node dictionary, merge conflicts)
+        self.merged_nodes = {}
+        self.is_dirty = False
+        self.load_errors = {}
+        self.load()
+    
+    def load(self):
+        if not self.persistent:
+            return
+        try:
+            with open(self.cache_file_name, 'rb') as file:
+                cache_data = parse_json(file.read())
+            if not isinstance(cache_data, dict) or cache_data.get('version') != build_cache_version:
+                return
+            files = cache_data['files']
+            # JSON turns the tuples of (file name, hash) sources into lists, but they're compared as tuples
+            merged_nodes = {key: (tuple(map(tuple, sources)), build_dict, node_conflicts)
+                            for key, (sources, build_dict, node_conflicts) in cache_data['merged_nodes'].items()}
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            # A corrupt or unreadable cache just means starting over
+            logger.warning('Ignoring the build cache %s because it could not be read: %s', self.cache_file_name, e)
+            return
+        self.files = files
+        self.merged_nodes = merged_nodes
+    
+    def save(self):
+        if not self.is_dirty or not self.persistent:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_data = {'version': build_cache_version, 'files': self.files, 'merged_nodes': self.merged_nodes}
+        write_file_atomically(self.cache_file_name, lambda file: dump_json(cache_data, file), binary=True)
+        self.is_dirty = False
+    
+    # Makes sure that the cached data is current for each of the files.  Returns the names of the files that were re-parsed.
+    # Files that can't be read or parsed are dropped from the cache and reported in load_errors.
+    def refresh(self, file_names, max_workers=None, use_processes=False):
+        self.load_errors = {}
+        stale_files = []
+        stats = {}
+        for file_name in file_names:
+            json_file_name = os.path.join(self.documentation_dir, file_name)
+            try:
+                stat = os.stat(json_file_name)
+            except FileNotFoundError:
+                self.load_errors[file_name] = 'Could not find the ' + json_file_name + ' file.'
+                if self.files.pop(file_name, None) is not None:
+                    self.is_dirty = True
+                continue
+            
+            entry = self.files.get(file_name)
+            if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                continue
+            stale_files.append(file_name)
+            stats[file_name] = stat
         
-        # Make sure that it's always an array of strings
-        if isinstance(used_by_list, str):
-            used_by_list = [used_by_list]
+        known_hashes = {file_name: self.files[file_name]['hash'] for file_name in stale_files if file_name in self.files}
+        results, errors = load_swimlane_files(stale_files, self.documentation_dir, max_workers=max_workers, use_processes=use_processes, known_hashes=known_hashes)
+        
+        changed_files = []
+        for file_name in stale_files:
+            self.is_dirty = True
+            stat = stats[file_name]
+            if file_name in errors:
+                self.load_errors[file_name] = errors[file_name]
+                self.files.pop(file_name, None)
+                continue
+            content_hash, json_data = results[file_name]
+            if json_data is None:
+                # Touched but not changed
+                entry = self.files[file_name]
+                entry['mtime_ns'] = stat.st_mtime_ns
+                entry['size'] = stat.st_size
+                continue
+            self.files[file_name] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'hash': content_hash, 'json_data': json_data}
+            changed_files.append(file_name)
+        report_load_errors(self.load_errors)
+        return changed_files
+    
+    # Same as refresh but for files in a SwimlaneDocumentStore.  The store keeps a content hash for each file, so only
+    # the files whose hash has changed are fetched and parsed.
+    def refresh_from_store(self, store, file_names):
+        self.load_errors = {}
+        known_hashes = {file_name: entry['hash'] for file_name, entry in self.files.items()}
+        results, errors = store.load_files(file_names, known_hashes=known_hashes)
+        
+        changed_files = []
+        for file_name in file_names:
+            if file_name in errors:
+                self.load_errors[file_name] = errors[file_name]
+                if self.files.pop(file_name, None) is not None:
+                    self.is_dirty = True
+                continue
+            content_hash, json_data = results[file_name]
+            if json_data is None:
+                continue
+            self.files[file_name] = {'mtime_ns': None, 'size': None, 'hash': content_hash, 'json_data': json_data}
+            self.is_dirty = True
+            changed_files.append(file_name)
+        report_load_errors(self.load_errors)
+        return changed_files
+    
+    # Drops the cached data for files that are no longer in the documentation directory
+    def prune(self, existing_file_names):
+        existing_file_names = set(existing_file_names)
+        for file_name in list(self.files.keys()):
+            if file_name not in existing_file_names:
+                del self.files[file_name]
+                self.is_dirty = True
+    
+    def get_loaded_files(self, file_names):
+        return [(file_name, self.files[file_name]['json_data']) for file_name in file_names if file_name in self.files]
+    
+    # Same result as build_json_nodes but only the nodes from changed files are re-merged.
+    # The merge conflicts for all of the nodes are added to conflicts if it's passed in.
+    def build_json_nodes(self, build_files, conflicts=None):
+        # Find the files (and their versions) that each node comes from, in build order
+        node_sources = {}
+        for file_name in build_files:
+            entry = self.files.get(file_name)
+            if entry is None:
+                continue
+            file_version = (file_name, entry['hash'])
+            for key in entry['json_data'].get('swimlane_nodes', {}):
+                sources = node_sources.get(key)
+                if sources is None:
+                    node_sources[key] = [file_version]
+                else:
+                    sources.append(file_version)
+        
+        merged_nodes = {}
+        json_nodes = []
+        for key, sources in node_sources.items():
+            sources = tuple(sources)
+            cached = self.merged_nodes.get(key)
+            if cached is not None and cached[0] == sources:
+                build_dict = cached[1]
+                node_conflicts = cached[2]
+            else:
+                node_conflicts = []
+                definitions = [(file_name, self.files[file_name]['json_data']['swimlane_nodes'][key]) for file_name, content_hash in sources]
+                build_dict = merge_node_definitions(key, definitions, node_conflicts)
+                build_dict['name'] = key
+                self.is_dirty = True
+            merged_nodes[key] = (sources, build_dict, node_conflicts)
+            if conflicts is not None:
+                conflicts.extend(node_conflicts)
+            
+            # Hand out copies so that callers can't change what's in the cache
+            json_nodes.append(copy_node_dict(build_dict))
         
-        for item in used_by_list:
-            names_of_nodes_using_another_node.add(item)
+        if len(merged_nodes) != len(self.merged_nodes):
+            self.is_dirty = True
+        self.merged_nodes = merged_nodes
+        return json_nodes
+    
+    def build_json_nodes_for_notebook(self, all_notebook_files):
+        # The notebook nodes only have one small dictionary per file so they're rebuilt from the cached file data
+        return merge_notebook_nodes(self.get_loaded_files(all_notebook_files))
+
+# Version of the document store schema
+document_store_version = 1
+# SQLite limits how many values can be bound in a single query
+max_store_query_names = 500
+
+# Keeps every swimlane file as a row of a single SQLite database instead of one json file per notebook so that large
+# documentation directories don't pay for listing, opening and parsing every file on each build.  Rows are keyed by
+# the same file names as the directory (e.g. Build_Test_1.json) and keep their order, so the merged nodes are the
+# same as building from the exported directory.  Use import_directory and export_directory to move between the two.
+# The generation goes up with every change so that it's cheap to tell when something has been saved.
+class SwimlaneDocumentStore:
+    
+    def __init__(self, database_file):
+        self.database_file = database_file
+        database_dir = os.path.dirname(database_file)
+        if database_dir:
+            os.makedirs(database_dir, exist_ok=True)
+        # Shared with the watcher's thread so every use of the connection holds the lock
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(database_file, timeout=30, check_same_thread=False)
+        with self.lock, self.connection:
+            # Several notebooks can save while a build is reading
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS files (file_name TEXT PRIMARY KEY, content_hash TEXT NOT NULL, json_data TEXT NOT NULL)')
+            self.connection.execute('INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)', ('version', document_store_version))
+            self.connection.execute('INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)', ('generation', 0))
+            version = self.connection.execute('SELECT value FROM meta WHERE key = ?', ('version',)).fetchone()[0]
+        if version != document_store_version:
+            raise Exception('The ' + database_file + ' store has version ' + str(version) + ' but version ' + str(document_store_version) + ' is needed.')
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def get_generation(self):
+        with self.lock:
+            return self.connection.execute('SELECT value FROM meta WHERE key = ?', ('generation',)).fetchone()[0]
+    
+    # The file names in the order that they were first saved
+    def get_file_names(self):
+        with self.lock:
+            return [row[0] for row in self.connection.execute('SELECT file_name FROM files ORDER BY rowid')]
+    
+    # Runs query once for every chunk of file_names.  The query has a single {} where the placeholders go.
+    def query_file_names(self, query, file_names):
+        rows = []
+        with self.lock:
+            for start in range(0, len(file_names), max_store_query_names):
+                chunk = file_names[start:start + max_store_query_names]
+                rows.extend(self.connection.execute(query.format(', '.join('?' * len(chunk))), chunk))
+        return rows
+    
+    # file name -> content hash for file_names (or every file)
+    def get_hashes(self, file_names=None):
+        if file_names is None:
+            with self.lock:
+                return dict(self.connection.execute('SELECT file_name, content_hash FROM files'))
+        return dict(self.query_file_names('SELECT file_name, content_hash FROM files WHERE file_name IN ({})', list(file_names)))
+    
+    # Returns the json data for a single file or None if it isn't in the store
+    def load(self, file_name):
+        results, errors = self.load_files([file_name])
+        if file_name not in results:
+            return None
+        return results[file_name][1]
+    
+    # Same as load_swimlane_files but with a single query.  Files whose content hash matches known_hashes aren't
+    # fetched or parsed and come back with None for the json data.
+    def load_files(self, file_names, known_hashes=None):
+        file_names = list(file_names)
+        unchanged_hashes = {}
+        fetch_names = file_names
+        if known_hashes:
+            # Reading every hash is quicker than looking up more than one chunk of names
+            hashes = self.get_hashes(file_names if len(file_names) <= max_store_query_names else None)
+            unchanged_hashes = {file_name: content_hash for file_name, content_hash in hashes.items() if content_hash == known_hashes.get(file_name)}
+            fetch_names = [file_name for file_name in file_names if file_name in hashes and file_name not in unchanged_hashes]
+        rows = {file_name: (content_hash, json_data) for file_name, content_hash, json_data
+                in self.query_file_names('SELECT file_name, content_hash, json_data FROM files WHERE file_name IN ({})', fetch_names)}
+        
+        results = {}
+        errors = {}
+        for file_name in file_names:
+            row = rows.get(file_name)
+            if row is None:
+                if file_name in unchanged_hashes:
+                    results[file_name] = (unchanged_hashes[file_name], None)
+                else:
+                    errors[file_name] = 'Could not find the ' + file_name + ' file in the ' + self.database_file + ' store.'
+                continue
+            content_hash, json_data = row
+            try:
+                results[file_name] = (content_hash, parse_json(json_data))
+            except ValueError as e:
+                errors[file_name] = 'Could not parse the ' + file_name + ' file in the ' + self.database_file + ' store: ' + str(e)
+        return results, errors
+    
+    def save(self, file_name, json_data):
+        self.save_files([(file_name, json_data)])
+    
+    # Saves (file name, json data) pairs in a single transaction.  Files that haven't changed aren't written.
+    def save_files(self, files):
+        rows = []
+        for file_name, json_data in files:
+            content = json.dumps(json_data)
+            rows.append((file_name, hashlib.sha1(content.encode('utf-8')).hexdigest(), content))
+        with self.lock, self.connection:
+            total_changes = self.connection.total_changes
+            self.connection.executemany('INSERT INTO files (file_name, content_hash, json_data) VALUES (?, ?, ?) '
+                                        'ON CONFLICT (file_name) DO UPDATE SET content_hash = excluded.content_hash, json_data = excluded.json_data '
+                                        'WHERE content_hash != excluded.content_hash', rows)
+            if self.connection.total_changes != total_changes:
+                self.connection.execute('UPDATE meta SET value = value + 1 WHERE key = ?', ('generation',))
+    
+    def delete(self, file_names):
+        if isinstance(file_names, str):
+            file_names = [file_names]
+        with self.lock, self.connection:
+            total_changes = self.connection.total_changes
+            self.connection.executemany('DELETE FROM files WHERE file_name = ?', [(file_name,) for file_name in file_names])
+            if self.connection.total_changes != total_changes:
+                self.connection.execute('UPDATE meta SET value = value + 1 WHERE key = ?', ('generation',))
+    
+    # Copies the swimlane files (all of them by default) from a documentation directory into the store.
+    # Returns the errors for the files that couldn't be read or parsed, which are left out.
+    def import_directory(self, documentation_dir, file_names=None, max_workers=None):
+        if file_names is None:
+            file_names = get_swimlane_file_names(documentation_dir)
+        file_names = normalize_swimlane_file_names(file_names)
+        results, errors = load_swimlane_files(file_names, documentation_dir, max_workers=max_workers)
+        report_load_errors(errors)
+        self.save_files((file_name, results[file_name][1]) for file_name in file_names if file_name in results)
+        return errors
+    
+    # Writes the files in the store (all of them by default) out as json files that SwimlaneDocumentation and
+    # SwimlaneBuildTool can use without the store.  Returns the names of the files that were written.
+    def export_directory(self, documentation_dir, file_names=None):
+        if file_names is None:
+            file_names = self.get_file_names()
+        os.makedirs(documentation_dir, exist_ok=True)
+        results, errors = self.load_files(normalize_swimlane_file_names(file_names))
+        report_load_errors(errors)
+        for file_name, (content_hash, json_data) in results.items():
+            write_swimlane_file(os.path.join(documentation_dir, file_name), json_data)
+        return list(results.keys())
+
+# Version of the layout cache entries.  Bump this whenever set_positions, the label placement or the colors change so
+# that layouts from the old algorithm aren't reused.
+layout_cache_version = 1
+default_layout_cache_bytes = 64 * 1024 * 1024
+
+# Hash of everything that the layout and colors depend on: the node names along with their used_by and freq values
+# and the layout options.  The node order is part of the hash since nodes that tie are placed in the order that they're listed.
+def get_layout_hash(json_nodes, resolve_edge_collisions=False, component_layout=False):
+    normalized_nodes = [[node['name'], node.get('freq'), normalize_used_by(node.get('used_by', []))] for node in json_nodes]
+    content_hash = hashlib.sha1()
+    content_hash.update(json.dumps([layout_cache_version, bool(resolve_edge_collisions), bool(component_layout)]).encode())
+    content_hash.update(json.dumps(normalized_nodes, separators=(',', ':')).encode())
+    return content_hash.hexdigest()
+
+# Packs a list of floats into base64 doubles for the layout cache
+def pack_doubles(values):
+    return base64.b64encode(array.array('d', values).tobytes()).decode('ascii')
+
+def unpack_doubles(text, byteorder):
+    values = array.array('d')
+    values.frombytes(base64.b64decode(text))
+    if byteorder != sys.byteorder:
+        values.byteswap()
+    return values
+
+# Persistent cache of finished layouts (pos, label_pos and node_colors) keyed by get_layout_hash.  Each layout is kept
+# in its own layout_<hash>.json file with the names listed once, the coordinates packed into base64 double arrays and
+# the colors stored as indexes into a small palette.  It's JSON rather than a pickle so that a cache in a shared
+# directory can't be used to run code.  Once the files add up to more than max_bytes, the least recently used
+# layouts are removed.
+class SwimlaneLayoutCache:
+    
+    def __init__(self, cache_dir, max_bytes=default_layout_cache_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+    
+    def get_file_name(self, layout_hash):
+        return os.path.join(self.cache_dir, 'layout_' + layout_hash + '.json')
+    
+    # Returns (pos, label_pos, node_colors) or None if the layout isn't cached
+    def get(self, layout_hash):
+        file_name = self.get_file_name(layout_hash)
+        try:
+            with open(file_name, 'rb') as file:
+                cache_data = parse_json(file.read())
+            if not isinstance(cache_data, dict) or cache_data.get('version') != layout_cache_version or cache_data.get('hash') != layout_hash:
+                return None
+            names = cache_data['names']
+            coordinates = unpack_doubles(cache_data['pos'], cache_data['byteorder'])
+            label_coordinates = unpack_doubles(cache_data['label_pos'], cache_data['byteorder'])
+            palette = cache_data['palette']
+            colors = [palette[code] for code in cache_data['colors']]
+            if len(coordinates) != 2 * len(names) or len(label_coordinates) != 2 * len(names) or len(colors) != len(names):
+                raise Exception('The layout has ' + str(len(names)) + ' names but the coordinates or colors do not match.')
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning('Ignoring the cached layout %s because it could not be read: %s', file_name, e)
+            return None
+        
+        # Touch the file so that it's the last to be evicted
+        try:
+            os.utime(file_name)
+        except OSError:
+            pass
+        
+        pos = dict(zip(names, zip(coordinates[0::2], coordinates[1::2])))
+        label_pos = dict(zip(names, zip(label_coordinates[0::2], label_coordinates[1::2])))
+        node_colors = dict(zip(names, colors))
+        return pos, label_pos, node_colors
+    
+    def put(self, layout_hash, pos, label_pos, node_colors):
+        names = list(pos)
+        if set(label_pos) != set(names) or set(node_colors) != set(names):
+            # Only complete layouts are cached
+            return
+        palette = sorted(set(node_colors.values()))
+        palette_codes = {color: code for code, color in enumerate(palette)}
+        coordinates = []
+        label_coordinates = []
+        for name in names:
+            coordinates.extend(pos[name])
+            label_coordinates.extend(label_pos[name])
+        cache_data = {'version': layout_cache_version, 'hash': layout_hash, 'byteorder': sys.byteorder, 'names': names,
+                      'pos': pack_doubles(coordinates), 'label_pos': pack_doubles(label_coordinates), 'palette': palette,
+                      'colors': [palette_codes[node_colors[name]] for name in names]}
+        
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_file_atomically(self.get_file_name(layout_hash), lambda file: dump_json(cache_data, file), binary=True)
+        self.evict()
+    
+    # Removes the least recently used layouts until the cache fits in max_bytes
+    def evict(self):
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as directory_entries:
+                for entry in directory_entries:
+                    if not entry.name.startswith('layout_'):
+                        continue
+                    if entry.name.endswith('.pickle'):
+                        # Layouts from before the cache was JSON are never read, so they're just removed
+                        try:
+                            os.remove(entry.path)
+                        except FileNotFoundError:
+                            pass
+                    elif entry.name.endswith('.json'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        except FileNotFoundError:
+            return
+        total_bytes = sum(size for mtime_ns, size, path in entries)
+        for mtime_ns, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+    
+    def clear(self):
+        max_bytes = self.max_bytes
+        self.max_bytes = -1
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = max_bytes
+
+# Number of stage records that a SwimlaneInstrumentation keeps
+default_max_stage_records = 1000
+
+# Collects timings and counts for each stage of a build (load, merge, longest_path, placement, label_placement and
+# graph_build).  Each callback is called as callback(event, record) with event 'start' or 'end'.  The record is a
+# dictionary with the stage name, any details (like for_notebook) and, at the end, seconds plus the stage's counts.
+class SwimlaneInstrumentation:
+    
+    # Only the last max_records records are kept so that a long running watcher doesn't keep adding to them.
+    # The totals for each stage cover every run.
+    def __init__(self, callbacks=None, max_records=default_max_stage_records):
+        self.callbacks = list(callbacks) if callbacks else []
+        self.max_records = max_records
+        self.records = deque(maxlen=max_records)
+        # stage name -> {'count', 'seconds', 'max_seconds'}
+        self.totals = {}
+    
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+    
+    @contextmanager
+    def stage(self, name, **details):
+        record = {'stage': name}
+        record.update(details)
+        for callback in self.callbacks:
+            callback('start', record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            self.records.append(record)
+            totals = self.totals.get(name)
+            if totals is None:
+                self.totals[name] = {'count': 1, 'seconds': record['seconds'], 'max_seconds': record['seconds']}
+            else:
+                totals['count'] += 1
+                totals['seconds'] += record['seconds']
+                totals['max_seconds'] = max(totals['max_seconds'], record['seconds'])
+            logger.debug('Stage %s took %.4fs: %s', name, record['seconds'], record)
+            for callback in self.callbacks:
+                callback('end', record)
+    
+    # Returns the records for the stages that have finished, optionally just the ones with a given name
+    def get_records(self, name=None):
+        return [dict(record) for record in self.records if name is None or record['stage'] == name]
+    
+    # Returns stage name -> {'count', 'seconds', 'max_seconds'} (or just the totals for one stage)
+    def get_totals(self, name=None):
+        if name is not None:
+            return dict(self.totals.get(name, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0}))
+        return {stage_name: dict(totals) for stage_name, totals in self.totals.items()}
+    
+    def clear(self):
+        self.records.clear()
+        self.totals = {}
+
+# Same as instrumentation.stage() but does nothing (other than hand back a record to fill in) without instrumentation
+def instrument_stage(instrumentation, name, **details):
+    if instrumentation is None:
+        return nullcontext({})
+    return instrumentation.stage(name, **details)
+
+def count_edges(json_nodes):
+    return sum(len(normalize_used_by(node.get('used_by', []))) for node in json_nodes)
+
+# Works out everything that set_positions needs from the json nodes
+def get_layout_inputs(json_nodes):
+    parent_dict = {}
+    
+    # Build the index once so that none of the helpers need to rescan json_nodes
+    graph_index = SwimlaneGraphIndex(json_nodes)
     
     # Get the list of 'base' nodes that aren't using anything (never listed in any node's used_by variable)
-    base_node_names = set(all_node_names) - names_of_nodes_using_another_node
+    base_node_names = graph_index.get_base_node_names()
     # This variable helps to determine row-level conflicts
     base_nodes_and_used_by = {}
-    for node in json_nodes:
-        node_name = node['name']
-        if node_name in base_node_names:
-            used_by_list = node.get('used_by', [])
-            # Make sure that it's always an array of strings
-            if isinstance(used_by_list, str):
-                used_by_list = [used_by_list]
-            base_nodes_and_used_by[node_name] = used_by_list
-    
-#     print('\nCALCULATIING HEIGHT:')
-#     print('\nset(all_node_names):', set(all_node_names))
-#     print('\nnames_of_nodes_using_another_node:', names_of_nodes_using_another_node)
-#     print('\nbase_node_names (set(all_node_names) - names_of_nodes_using_another_node):', base_node_names)
-    
-    # Get the list of nodes without a used_by setting or an empty array
-    final_node_names = [node['name'] for node in json_nodes if 'used_by' not in node or not node['used_by']]
-    
-    max_width = 0
+    for node_name in base_node_names:
+        base_nodes_and_used_by[node_name] = graph_index.get_used_by(node_name)
+    
     max_height = len(base_node_names)
-    for node_name in final_node_names:
-        longest_path = [node_name] + find_longest_path_from_final(json_nodes, node_name)
-        longest_parent_paths[node_name] = longest_path
-#         print(f"Longest path for {node_name}: {longest_path}", )
-        path_length = len(longest_path)
-        if path_length > max_width:
-            max_width = path_length
+    # Get the longest path for the nodes without a used_by setting or an empty array
+    longest_parent_paths, max_width = SwimlaneLongestPaths(graph_index).get_final_node_paths()
     
     for node in json_nodes:
         node_name = node['name']
-#         print('\nChecking number of children for', node_name)
-        children = determine_children_for_parent(json_nodes, node_name)
-        child_dict[node_name] = children
-        parent_dict[node_name] = node.get('used_by', [])
-#         print(f"Children for {node_name}: {children}")
+        parent_dict[node_name] = graph_index.get_used_by(node_name)
         
     sorted_parent_paths = sorted(longest_parent_paths.keys(), key=lambda node: len(longest_parent_paths[node]), reverse=True)
     
-    # Update the postions
-    pos = set_positions(pos, max_height, max_width, parent_dict, longest_parent_paths, sorted_parent_paths, base_nodes_and_used_by)
-    
-    # Adjust the label positions based on the label offset and a 
-    # row-based curving algorithm so that the names don't overwrite others on the same row
+    return {'max_height': max_height, 'max_width': max_width, 'parent_dict': parent_dict, 'longest_parent_paths': longest_parent_paths,
+            'sorted_parent_paths': sorted_parent_paths, 'base_nodes_and_used_by': base_nodes_and_used_by}
+
+# Adjust the label positions based on the label offset and a 
+# row-based curving algorithm so that the names don't overwrite others on the same row
+def calculate_label_positions(pos, max_width, max_height):
+    label_pos = {}
     center_x = max_width/2
     y_axis_shift = 0.4*max_height
     for k, (x,y) in pos.items():
@@ -422,42 +2430,622 @@ def set_final_node_and_label_positions(pos, json_nodes):
             label_pos[k] = (x, y + y_offset)
         else:
             label_pos[k] = (x, y - y_offset)
+    return label_pos
+
+# instrumentation is an optional SwimlaneInstrumentation that each stage of the layout is reported to
+def set_final_node_and_label_positions(pos, json_nodes, resolve_edge_collisions=False, instrumentation=None, **stage_details):
+    with instrument_stage(instrumentation, 'longest_path', **stage_details) as record:
+        layout_inputs = get_layout_inputs(json_nodes)
+        record['node_count'] = len(pos)
+        record['max_width'] = layout_inputs['max_width']
+        record['max_height'] = layout_inputs['max_height']
+    
+    # Update the postions
+    with instrument_stage(instrumentation, 'placement', **stage_details) as record:
+        pos = set_positions(pos, resolve_edge_collisions=resolve_edge_collisions, stats=record, **layout_inputs)
+        record['node_count'] = len(pos)
+    
+    with instrument_stage(instrumentation, 'label_placement', **stage_details) as record:
+        label_pos = calculate_label_positions(pos, layout_inputs['max_width'], layout_inputs['max_height'])
+        record['node_count'] = len(label_pos)
+    return pos, label_pos
+
+# Splits the json nodes into weakly connected components (nodes that are linked through used_by in either direction).
+# Components are listed in the order that their first node appears and each one keeps the order of its nodes.
+def find_weakly_connected_components(json_nodes):
+    graph_index = SwimlaneGraphIndex(json_nodes)
+    parent = list(range(len(graph_index.names)))
+    for node_id, used_by_ids in enumerate(graph_index.used_by):
+        if not used_by_ids:
+            continue
+        node_root = node_id
+        while parent[node_root] != node_root:
+            parent[node_root] = parent[parent[node_root]]
+            node_root = parent[node_root]
+        for used_by_id in used_by_ids:
+            used_by_root = used_by_id
+            while parent[used_by_root] != used_by_root:
+                parent[used_by_root] = parent[parent[used_by_root]]
+                used_by_root = parent[used_by_root]
+            # The lower id stays the root
+            if used_by_root < node_root:
+                parent[node_root] = used_by_root
+                node_root = used_by_root
+            elif node_root < used_by_root:
+                parent[used_by_root] = node_root
     
+    components = {}
+    for node in json_nodes:
+        root_id = graph_index.get_id(node['name'])
+        while parent[root_id] != root_id:
+            root_id = parent[root_id]
+        components.setdefault(root_id, []).append(node)
+    return list(components.values())
+
+# Lays out a single component on its own.  Returns its pos along with its max_width, max_height and placement stats.
+def layout_component(json_nodes, resolve_edge_collisions=False):
+    initial_pos, node_colors = set_colors_and_initial_node_positions(json_nodes)
+    layout_inputs = get_layout_inputs(json_nodes)
+    stats = {}
+    pos = set_positions(initial_pos, resolve_edge_collisions=resolve_edge_collisions, stats=stats, **layout_inputs)
+    return pos, layout_inputs['max_width'], layout_inputs['max_height'], stats
+
+# Lays out a batch of components (so that the process pool isn't sent thousands of tiny tasks)
+def layout_component_batch(components, resolve_edge_collisions=False):
+    return [layout_component(json_nodes, resolve_edge_collisions) for json_nodes in components]
+
+# Component by component version of set_final_node_and_label_positions for graphs that are made up of independent
+# lineages.  Each weakly connected component is laid out on its own (across a process pool of max_workers when
+# there are enough nodes) and the results are stacked from top to bottom in the order that the components first appear,
+# with component_gap empty rows between them.  Components are lined up on the right so that the final nodes share a
+# column.  The output doesn't depend on the number of workers.
+def set_node_and_label_positions_by_component(json_nodes, resolve_edge_collisions=False, max_workers=None, component_gap=1,
+                                              instrumentation=None, **stage_details):
+    with instrument_stage(instrumentation, 'component_split', **stage_details) as record:
+        components = find_weakly_connected_components(json_nodes)
+        record['component_count'] = len(components)
+        record['largest_component'] = max((len(component) for component in components), default=0)
+    
+    with instrument_stage(instrumentation, 'component_layout', **stage_details) as record:
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_workers <= 1 or len(json_nodes) < min_nodes_for_parallel_layout or len(components) < 2:
+            results = layout_component_batch(components, resolve_edge_collisions)
+            record['workers'] = 1
+        else:
+            # Batch the small components together.  Anything bigger than a batch goes on its own.
+            batch_size = max(1, len(json_nodes) // (max_workers * 4))
+            batches = []
+            batch = []
+            batch_node_count = 0
+            for component in components:
+                batch.append(component)
+                batch_node_count += len(component)
+                if batch_node_count >= batch_size:
+                    batches.append(batch)
+                    batch = []
+                    batch_node_count = 0
+            if batch:
+                batches.append(batch)
+            
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+                batch_results = list(executor.map(layout_component_batch, batches, [resolve_edge_collisions] * len(batches)))
+            results = [result for batch_result in batch_results for result in batch_result]
+            record['workers'] = max_workers
+            record['batch_count'] = len(batches)
+        record['node_count'] = len(json_nodes)
+        # Add up the placement stats (e.g. the edge collisions before and after) of all of the components
+        for component_pos, component_width, component_height, component_stats in results:
+            for key, value in component_stats.items():
+                record[key] = record.get(key, 0) + value
+    
+    with instrument_stage(instrumentation, 'component_stitch', **stage_details) as record:
+        max_width = max((component_width for component_pos, component_width, component_height, component_stats in results), default=0)
+        max_height = 0
+        stitched_pos = {}
+        y_offset = 0
+        for component_pos, component_width, component_height, component_stats in results:
+            x_offset = max_width - component_width
+            top_y = 0
+            for node_name, (x_pos, y_pos) in component_pos.items():
+                stitched_pos[node_name] = (x_pos + x_offset, y_pos + y_offset)
+                top_y = max(top_y, y_pos)
+            y_offset += math.floor(top_y) + 1 + component_gap
+            max_height += component_height
+        # Same order as json_nodes like set_positions
+        pos = {node['name']: stitched_pos[node['name']] for node in json_nodes}
+        record['node_count'] = len(pos)
+    
+    with instrument_stage(instrumentation, 'label_placement', **stage_details) as record:
+        label_pos = calculate_label_positions(pos, max_width, max_height)
+        record['node_count'] = len(label_pos)
     return pos, label_pos
 
+# Matplotlib's '-|>' arrow head is 0.4 long and 0.2 wide for each point of arrowsize
+arrow_head_length = 0.4
+arrow_head_width = 0.2
+# Each curved edge is drawn as this many straight segments
+curved_edge_segments = 12
+# Rough size of a label in font sizes for label culling
+label_char_width = 0.6
+label_line_height = 1.2
+# (outline, advance width in points) of each character that's been drawn by (character, font size, font weight)
+label_glyphs = {}
+
+# Labels are drawn from the outline of each character (made once and reused) so that all of them can go in a single
+# collection instead of laying out and rasterizing every label as its own text artist
+def get_label_glyph(char, font_size, font_weight):
+    key = (char, font_size, font_weight)
+    glyph = label_glyphs.get(key)
+    if glyph is None:
+        from matplotlib.font_manager import FontProperties
+        from matplotlib.textpath import TextPath, text_to_path
+        font = FontProperties(size=font_size, weight=font_weight)
+        advance = text_to_path.get_text_width_height_descent(char, font, ismath=False)[0]
+        # Spaces only move the next character along
+        path = None if char.isspace() else TextPath((0, 0), char, size=font_size, prop=font)
+        glyph = label_glyphs[key] = (path, advance)
+    return glyph
+
+# How far the baseline is below the middle of a line of text, in points (same as verticalalignment='center')
+def get_label_baseline_offset(font_size, font_weight):
+    from matplotlib.font_manager import FontProperties
+    from matplotlib.textpath import text_to_path
+    width, height, descent = text_to_path.get_text_width_height_descent('lp', FontProperties(size=font_size, weight=font_weight), ismath=False)
+    return height / 2 - descent
+
+# Returns the rad of an 'arc3, rad=0.1' connection style (0.0 for None or 'arc3')
+def get_arc3_rad(connectionstyle):
+    if not connectionstyle:
+        return 0.0
+    style_name, _, arguments = connectionstyle.replace(' ', '').partition(',')
+    if style_name != 'arc3':
+        raise Exception('Only the arc3 connection style can be rendered, not ' + connectionstyle + '.')
+    rad = 0.0
+    for argument in arguments.split(','):
+        key, _, value = argument.partition('=')
+        if key == 'rad':
+            rad = float(value)
+    return rad
+
+# Picks the labels to draw.  The most connected nodes are kept first when there are more than max_labels and, with
+# cull_labels, a label that would overlap one that's already been kept is dropped.  label_xy is in display pixels.
+def select_labels(label_names, label_xy, degrees, max_labels=None, cull_labels=False, font_size=8, pixels_per_point=1.0):
+    order = sorted(range(len(label_names)), key=lambda label_index: -degrees[label_index])
+    if max_labels is not None and not cull_labels:
+        return sorted(order[:max_labels])
+    
+    selected = []
+    height = label_line_height * font_size * pixels_per_point
+    # Every kept label box is added to each of the grid cells that it spans
+    cells = {}
+    for label_index in order:
+        if max_labels is not None and len(selected) >= max_labels:
+            break
+        half_width = label_char_width * font_size * pixels_per_point * len(str(label_names[label_index])) / 2
+        x, y = label_xy[label_index]
+        box = (x - half_width, y - height / 2, x + half_width, y + height / 2)
+        cell_keys = [(cell_x, cell_y) for cell_x in range(math.floor(box[0] / height), math.floor(box[2] / height) + 1)
+                     for cell_y in range(math.floor(box[1] / height), math.floor(box[3] / height) + 1)]
+        if any(box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]
+               for cell_key in cell_keys for other in cells.get(cell_key, ())):
+            continue
+        for cell_key in cell_keys:
+            cells.setdefault(cell_key, []).append(box)
+        selected.append(label_index)
+    return sorted(selected)
+
+# Draws the swimlanes with one scatter per marker for the nodes, one LineCollection for the edges (curved like
+# connectionstyle='arc3, rad=...' in nx.draw) and one PolyCollection for the arrow heads instead of an artist for every
+# node and edge.  The curves and arrow heads are worked out for the size of the axes when it's drawn.
+# Without ax, it's drawn on a new figure that isn't managed by pyplot so nothing needs a display or needs to be closed.
+# With file_name, the figure is saved there (the extension picks the format such as .png or .svg).
+# The labels are drawn as outlines in one collection too.  Use text_labels for a text artist per label instead (so the
+# text can be selected in an svg or use mathtext).  max_labels and cull_labels thin out the labels on dense graphs
+# (see select_labels).  Returns the axes.
+def render_swimlane(json_nodes, pos, label_pos, node_colors, ax=None, file_name=None, figsize=(15, 15), dpi=100, node_size=1000,
+                    node_color='skyblue', font_size=8, font_color='black', font_weight='bold', edge_color='black', width=1.0, arrowsize=20,
+                    connectionstyle='arc3, rad=0.1', max_labels=None, cull_labels=False, text_labels=False, stats=None):
+    if np is None:
+        raise Exception('NumPy is needed to render the swimlanes.')
+    try:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.collections import LineCollection, PathCollection, PolyCollection
+        from matplotlib.colors import to_rgba_array
+        from matplotlib.figure import Figure
+        from matplotlib.transforms import Affine2D
+    except ImportError:
+        raise Exception('Matplotlib is needed to render the swimlanes.')
+    rad = get_arc3_rad(connectionstyle)
+    
+    # Only the nodes that have been placed can be drawn
+    names = []
+    markers = []
+    for node in json_nodes:
+        if node['name'] in pos:
+            names.append(node['name'])
+            markers.append(node.get('marker') or 'o')
+    name_index = {name: node_index for node_index, name in enumerate(names)}
+    xy = np.array([pos[name] for name in names], dtype=float).reshape(-1, 2)
+    sources = []
+    targets = []
+    for node in json_nodes:
+        source = name_index.get(node['name'])
+        if source is None:
+            continue
+        for used_by_name in normalize_used_by(node.get('used_by', [])):
+            target = name_index.get(used_by_name)
+            if target is not None and target != source:
+                sources.append(source)
+                targets.append(target)
+    
+    if ax is None:
+        figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot()
+    figure = ax.figure
+    ax.set_axis_off()
+    
+    # The limits have to be set before the edges are worked out in display space
+    label_names = [name for name in names if name in label_pos]
+    label_xy = np.array([label_pos[name] for name in label_names], dtype=float).reshape(-1, 2)
+    all_xy = np.concatenate([xy, label_xy])
+    if len(all_xy):
+        low = all_xy.min(axis=0)
+        high = all_xy.max(axis=0)
+        padding = np.maximum((high - low) * 0.05, 0.5)
+        ax.set_xlim(low[0] - padding[0], high[0] + padding[0])
+        ax.set_ylim(low[1] - padding[1], high[1] + padding[1])
+    
+    # Same colors as node_colors[node] in nx.draw with a palette so that each color is only converted once
+    colors = [node_colors.get(name, node_color) for name in names]
+    palette = list(dict.fromkeys(colors))
+    palette_index = {color: color_index for color_index, color in enumerate(palette)}
+    rgba = to_rgba_array(palette)[np.array([palette_index[color] for color in colors], dtype=np.int64)] if names else np.zeros((0, 4))
+    marker_array = np.array(markers, dtype=object)
+    for marker in dict.fromkeys(markers):
+        mask = marker_array == marker
+        ax.scatter(xy[mask, 0], xy[mask, 1], s=node_size, c=rgba[mask], marker=marker, zorder=2)
+    
+    pixels_per_point = figure.dpi / 72
+    if sources:
+        to_display = ax.transData.transform
+        start = to_display(xy[sources])
+        end = to_display(xy[targets])
+        if rad:
+            # Quadratic Bezier through the same control point as matplotlib's arc3
+            delta = end - start
+            control = (start + end) / 2 + rad * np.column_stack([delta[:, 1], -delta[:, 0]])
+            t = np.linspace(0.0, 1.0, curved_edge_segments + 1)[None, :, None]
+            curves = (1 - t) ** 2 * start[:, None, :] + 2 * (1 - t) * t * control[:, None, :] + t ** 2 * end[:, None, :]
+            end_direction = end - control
+        else:
+            curves = np.stack([start, end], axis=1)
+            end_direction = end - start
+        
+        # The arrow heads point along the end of each edge and stop at the edge of the node's marker
+        length = np.hypot(end_direction[:, 0], end_direction[:, 1])
+        unit = end_direction / np.maximum(length, 1e-9)[:, None]
+        normal = np.column_stack([-unit[:, 1], unit[:, 0]])
+        head_angle = math.atan2(arrow_head_width, arrow_head_length)
+        head_size = arrow_head_length * arrowsize * pixels_per_point
+        tip = end - unit * (math.sqrt(node_size) / 2 * pixels_per_point)
+        base = tip - unit * (head_size * math.cos(head_angle))
+        half_width = head_size * math.sin(head_angle)
+        heads = np.stack([tip, base + normal * half_width, base - normal * half_width], axis=1)
+        
+        to_data = ax.transData.inverted().transform
+        curves = to_data(curves.reshape(-1, 2)).reshape(curves.shape)
+        heads = to_data(heads.reshape(-1, 2)).reshape(heads.shape)
+        ax.add_collection(LineCollection(curves, colors=edge_color, linewidths=width, zorder=1))
+        ax.add_collection(PolyCollection(heads, facecolors=edge_color, edgecolors=edge_color, linewidths=width, zorder=1))
+    
+    selected_labels = range(len(label_names))
+    if (max_labels is not None and max_labels < len(label_names)) or cull_labels:
+        degrees = np.bincount(np.array(sources + targets, dtype=np.int64), minlength=len(names))
+        label_degrees = [degrees[name_index[name]] for name in label_names]
+        selected_labels = select_labels(label_names, ax.transData.transform(label_xy) if len(label_xy) else label_xy, label_degrees,
+                                        max_labels=max_labels, cull_labels=cull_labels, font_size=font_size, pixels_per_point=pixels_per_point)
+    if text_labels:
+        for label_index in selected_labels:
+            ax.text(label_xy[label_index, 0], label_xy[label_index, 1], label_names[label_index], fontsize=font_size, color=font_color,
+                    fontweight=font_weight, horizontalalignment='center', verticalalignment='center', clip_on=True)
+    elif len(selected_labels) and any(str(label_names[label_index]).strip() for label_index in selected_labels):
+        # Each character is placed (in points from the middle of its label) and drawn from its cached outline
+        glyph_paths = []
+        glyph_labels = []
+        glyph_x = []
+        for label_index in selected_labels:
+            glyphs = [get_label_glyph(char, font_size, font_weight) for char in str(label_names[label_index])]
+            x = -sum(advance for path, advance in glyphs) / 2
+            for path, advance in glyphs:
+                if path is not None:
+                    glyph_paths.append(path)
+                    glyph_labels.append(label_index)
+                    glyph_x.append(x)
+                x += advance
+        glyph_offsets = np.column_stack([glyph_x, np.full(len(glyph_x), -get_label_baseline_offset(font_size, font_weight))])
+        glyph_xy = ax.transData.transform(label_xy[glyph_labels]) + glyph_offsets * pixels_per_point
+        ax.add_collection(PathCollection(glyph_paths, offsets=ax.transData.inverted().transform(glyph_xy), offset_transform=ax.transData,
+                                         transform=Affine2D().scale(1 / 72) + figure.dpi_scale_trans, facecolors=font_color, edgecolors='none',
+                                         zorder=3, clip_on=True), autolim=False)
+    
+    if file_name:
+        figure.savefig(file_name, dpi=figure.dpi)
+    if stats is not None:
+        stats['node_count'] = len(names)
+        stats['edge_count'] = len(sources)
+        stats['label_count'] = len(selected_labels)
+        stats['culled_label_count'] = len(label_names) - len(selected_labels)
+    return ax
+
 class SwimlaneBuildTool:
     
-    def __init__ (self, swimlane_files=None, documentation_dir=default_swimlane_directory):
+    def __init__ (self, swimlane_files=None, documentation_dir=default_swimlane_directory, use_cache=False, cache_dir=None, load_workers=None, use_processes=False, resolve_edge_collisions=False, compact=False, stage_callbacks=None,
+                  use_layout_cache=False, layout_cache_bytes=default_layout_cache_bytes, component_layout=False, layout_workers=None, store=None):
         # When initialized, this should preload all of the specified json files in the documentation directory.
         # If none are listed, then load them all from the documentation_dir and merge them.
         # In the end, you should end up with a file similar to the previous version.
+        # With a store (a SwimlaneDocumentStore or the path to its database), the files are read from the store
+        # instead of the documentation directory.  A store that's opened from a path is closed by close().
+        self.owns_store = isinstance(store, str)
+        if self.owns_store:
+            store = SwimlaneDocumentStore(store)
         # If the documentation directory doesn't exist, throw an error
-        if not os.path.exists(documentation_dir):
+        if store is None and not os.path.exists(documentation_dir):
             raise Exception('The' + documentation_dir + ' directory does not exist!')
         
-        self.json_nodes = build_json_nodes(swimlane_files, documentation_dir)
-#         print('\nself.json_nodes', self.json_nodes, '\n\n')
-
-        self.pos, self.node_colors = set_colors_and_initial_node_positions(self.json_nodes)
-        self.pos, self.label_pos = set_final_node_and_label_positions(self.pos, self.json_nodes)
+        self.swimlane_files = swimlane_files
+        self.documentation_dir = documentation_dir
+        self.store = store
+        # load_workers and use_processes control the pool that the files are loaded on
+        self.load_workers = load_workers
+        self.use_processes = use_processes
+        # Moves nodes that edges pass through (see relocate_edge_collisions)
+        self.resolve_edge_collisions = resolve_edge_collisions
+        # With component_layout, each independent lineage is laid out on its own (across layout_workers processes)
+        # and stacked (see set_node_and_label_positions_by_component)
+        self.component_layout = component_layout
+        self.layout_workers = layout_workers
+        # With compact, the nodes and positions are kept in a SwimlaneCompactGraph and json_nodes, pos, label_pos
+        # and node_colors (along with the notebook versions) are views of it
+        self.compact = compact
+        # Timings and counts for each stage of the build.  See get_stage_stats and add_stage_callback.
+        self.instrumentation = SwimlaneInstrumentation(stage_callbacks)
         
-        self.json_notebook_nodes = build_json_nodes_for_notebook(swimlane_files, documentation_dir)
-        self.notebook_pos, self.notebook_node_colors = set_colors_and_initial_node_positions(self.json_notebook_nodes)
-#         print('\nself.notebook_pos:', self.notebook_pos)
-#         print('\nself.notebook_node_colors:', self.notebook_node_colors)
-        self.notebook_pos, self.notebook_label_pos = set_final_node_and_label_positions(self.notebook_pos, self.json_notebook_nodes)
+        # With use_cache, the parsed files and merged nodes are kept in documentation_dir/.cache (or cache_dir)
+        # so that rebuilding only has to re-read the files that have changed.  With a store, the store already keeps
+        # a hash of every file so the cache is only kept in memory and nothing is written to documentation_dir.
+        self.build_cache = None
+        if use_cache:
+            self.build_cache = SwimlaneBuildCache(documentation_dir, cache_dir=cache_dir, persistent=store is None)
+        # With use_layout_cache, finished layouts are kept in the same directory (next to the store's database with
+        # a store) so that a graph that hasn't changed doesn't have to be laid out again.  layout_cache_bytes bounds
+        # the size of the cached layouts.
+        self.layout_cache = None
+        if use_layout_cache:
+            if not cache_dir:
+                cache_dir = os.path.join(os.path.dirname(store.database_file) if store is not None else documentation_dir, '.cache')
+            self.layout_cache = SwimlaneLayoutCache(cache_dir, max_bytes=layout_cache_bytes)
         
-    def get_initialized_notebook_DiGraph(self):
-        return self.get_initialized_DiGraph(for_notebook=True)
+        # Nothing is loaded or laid out until it's first used.  See lazy_dependencies.
+        self._lazy_values = {}
+    
+    # Closes the store if it was opened from a path.  A store that was passed in is left for its owner to close.
+    def close(self):
+        if self.owns_store and self.store is not None:
+            self.store.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    # Everything below is computed on first use and kept until something that it depends on changes
+    lazy_dependencies = {
+        'loaded_files': ['load_errors', 'merge_conflicts', 'build_files', 'all_notebook_files', 'file_summaries', 'json_nodes', 'json_notebook_nodes'],
+        'json_nodes': ['compact_graph', 'pos', 'label_pos', 'node_colors', 'graph', 'reachability_index', 'edge_arrays'],
+        'json_notebook_nodes': ['notebook_compact_graph', 'notebook_pos', 'notebook_label_pos', 'notebook_node_colors', 'notebook_graph',
+                                'notebook_reachability_index', 'notebook_edge_arrays'],
+    }
+    
+    def get_lazy_value(self, name, compute):
+        if name not in self._lazy_values:
+            compute()
+        return self._lazy_values[name]
+    
+    def set_lazy_value(self, name, value):
+        self.invalidate(name)
+        self._lazy_values[name] = value
     
-    def get_initialized_DiGraph(self, for_notebook=False):
+    # Drops a computed value along with everything that depends on it so that it's recomputed on the next use
+    def invalidate(self, name):
+        self._lazy_values.pop(name, None)
+        for dependent_name in self.lazy_dependencies.get(name, []):
+            self.invalidate(dependent_name)
+    
+    # Picks up any changes in the documentation directory the next time that something is used
+    def reload(self):
+        self.invalidate('loaded_files')
+    
+    def load_files(self):
+        # The notebook nodes always use every file in the directory, so both builders share a single load pass
+        if self.store is not None:
+            all_notebook_files = self.store.get_file_names()
+        else:
+            all_notebook_files = get_swimlane_file_names(self.documentation_dir)
+        if self.swimlane_files:
+            build_files = normalize_swimlane_file_names(self.swimlane_files)
+        else:
+            build_files = all_notebook_files
+        all_notebook_file_set = set(all_notebook_files)
+        load_files = all_notebook_files + [file for file in build_files if file not in all_notebook_file_set]
+        
+        with self.instrumentation.stage('load') as record:
+            if self.build_cache:
+                if self.store is not None:
+                    changed_files = self.build_cache.refresh_from_store(self.store, load_files)
+                else:
+                    changed_files = self.build_cache.refresh(load_files, max_workers=self.load_workers, use_processes=self.use_processes)
+                record['changed_file_count'] = len(changed_files)
+                self.build_cache.prune(load_files)
+                self.build_cache.save()
+                load_errors = self.build_cache.load_errors
+                loaded_files = None
+            else:
+                results, load_errors = self.read_files(load_files)
+                report_load_errors(load_errors)
+                loaded_files = {file: json_data for file, (content_hash, json_data) in results.items()}
+            record['file_count'] = len(load_files)
+            record['error_count'] = len(load_errors)
+        
+        self.set_lazy_value('loaded_files', loaded_files)
+        self._lazy_values['load_errors'] = load_errors
+        self._lazy_values['build_files'] = build_files
+        self._lazy_values['all_notebook_files'] = all_notebook_files
+    
+    # Reads and parses the files from the store or the documentation directory.  Returns (results, errors) like
+    # load_swimlane_files.
+    def read_files(self, file_names):
+        if self.store is not None:
+            return self.store.load_files(file_names)
+        return load_swimlane_files(file_names, self.documentation_dir, max_workers=self.load_workers, use_processes=self.use_processes)
+    
+    # Returns (file name, json data) for each of the file_names that loaded, in order.  The parsed files are kept in the
+    # build cache with use_cache.  Otherwise they're kept until the nodes are built in compact mode (see
+    # release_loaded_files), after which only the file summaries are left and the files would have to be read again.
+    def get_loaded_files(self, file_names):
+        if self.build_cache:
+            return self.build_cache.get_loaded_files(file_names)
+        loaded_files = self.get_lazy_value('loaded_files', self.load_files)
+        if loaded_files is None:
+            results, errors = self.read_files(file_names)
+            loaded_files = {file: json_data for file, (content_hash, json_data) in results.items()}
+        return [(file, loaded_files[file]) for file in file_names if file in loaded_files]
+    
+    # Returns (file name, summary) for each of the file_names that loaded, in order (see summarize_swimlane_file).
+    # These are kept after the parsed files are let go of so that the notebook nodes and the run times don't have to
+    # read every file again.
+    def get_file_summaries(self, file_names):
+        file_summaries = self._lazy_values.get('file_summaries')
+        if file_summaries is None:
+            return [(file, summarize_swimlane_file(json_data)) for file, json_data in self.get_loaded_files(file_names)]
+        return [(file, file_summaries[file]) for file in file_names if file in file_summaries]
+    
+    # In compact mode the parsed files are most of the memory that's left once the nodes are in a compact graph, so
+    # they're let go of once the merged nodes (and their merge conflicts) have been built, which is the last thing
+    # that needs all of them.  Only a summary of each file is kept.
+    def release_loaded_files(self):
+        loaded_files = self._lazy_values.get('loaded_files')
+        if self.compact and loaded_files is not None and 'merge_conflicts' in self._lazy_values:
+            self._lazy_values['file_summaries'] = {file: summarize_swimlane_file(json_data) for file, json_data in loaded_files.items()}
+            self._lazy_values['loaded_files'] = None
+    
+    def build_nodes(self):
+        self.get_lazy_value('loaded_files', self.load_files)
+        build_files = self._lazy_values['build_files']
+        merge_conflicts = []
+        with self.instrumentation.stage('merge', for_notebook=False) as record:
+            if self.build_cache:
+                json_nodes = self.build_cache.build_json_nodes(build_files, merge_conflicts)
+                self.build_cache.save()
+            else:
+                json_nodes = merge_swimlane_nodes(self.get_loaded_files(build_files), merge_conflicts)
+            record['node_count'] = len(json_nodes)
+            record['edge_count'] = count_edges(json_nodes)
+            record['conflict_count'] = len(merge_conflicts)
+        report_merge_conflicts(merge_conflicts)
+        self._lazy_values['merge_conflicts'] = merge_conflicts
+        self.store_nodes(json_nodes)
+        self.release_loaded_files()
+    
+    def store_nodes(self, json_nodes, for_notebook=False):
+        if self.compact:
+            compact_graph = SwimlaneCompactGraph(json_nodes)
+            self._lazy_values['notebook_compact_graph' if for_notebook else 'compact_graph'] = compact_graph
+            json_nodes = compact_graph.json_nodes_view()
+        self._lazy_values['json_notebook_nodes' if for_notebook else 'json_nodes'] = json_nodes
+    
+    def build_notebook_nodes(self):
+        self.get_lazy_value('loaded_files', self.load_files)
+        all_notebook_files = self._lazy_values['all_notebook_files']
+        with self.instrumentation.stage('merge', for_notebook=True) as record:
+            if self.build_cache:
+                json_notebook_nodes = self.build_cache.build_json_nodes_for_notebook(all_notebook_files)
+            else:
+                json_notebook_nodes = merge_notebook_nodes(self.get_file_summaries(all_notebook_files))
+            record['node_count'] = len(json_notebook_nodes)
+            record['edge_count'] = count_edges(json_notebook_nodes)
+        self.store_nodes(json_notebook_nodes, for_notebook=True)
+        self.release_loaded_files()
+    
+    def build_compact_graph(self, for_notebook=False):
+        prefix = 'notebook_' if for_notebook else ''
+        json_nodes = self.json_notebook_nodes if for_notebook else self.json_nodes
+        if prefix + 'compact_graph' not in self._lazy_values:
+            self._lazy_values[prefix + 'compact_graph'] = SwimlaneCompactGraph(json_nodes)
+    
+    # The colors and positions are computed together, but anything that has already been set is kept.
+    # Returns the initial positions and the computed colors.
+    def build_colors(self, for_notebook=False):
+        prefix = 'notebook_' if for_notebook else ''
+        json_nodes = self.json_notebook_nodes if for_notebook else self.json_nodes
+        initial_pos, computed_colors = set_colors_and_initial_node_positions(json_nodes)
+        node_colors = computed_colors
+        if self.compact:
+            node_colors = self.get_compact_graph(for_notebook).colors_view()
+        self._lazy_values.setdefault(prefix + 'node_colors', node_colors)
+        return initial_pos, computed_colors
+    
+    def build_layout(self, for_notebook=False):
+        prefix = 'notebook_' if for_notebook else ''
+        json_nodes = self.json_notebook_nodes if for_notebook else self.json_nodes
+        
+        cached_layout = None
+        if self.layout_cache:
+            with self.instrumentation.stage('layout_cache', for_notebook=for_notebook) as record:
+                layout_hash = get_layout_hash(json_nodes, self.resolve_edge_collisions, self.component_layout)
+                cached_layout = self.layout_cache.get(layout_hash)
+                record['hit'] = cached_layout is not None
+                record['node_count'] = len(json_nodes)
+        
+        if cached_layout:
+            pos, label_pos, node_colors = cached_layout
+            if self.compact:
+                node_colors = self.get_compact_graph(for_notebook).colors_view()
+            self._lazy_values.setdefault(prefix + 'node_colors', node_colors)
+        else:
+            initial_pos, node_colors = self.build_colors(for_notebook=for_notebook)
+            if self.component_layout:
+                pos, label_pos = set_node_and_label_positions_by_component(json_nodes, resolve_edge_collisions=self.resolve_edge_collisions,
+                                                                           max_workers=self.layout_workers, instrumentation=self.instrumentation,
+                                                                           for_notebook=for_notebook)
+            else:
+                pos, label_pos = set_final_node_and_label_positions(initial_pos, json_nodes, resolve_edge_collisions=self.resolve_edge_collisions,
+                                                                    instrumentation=self.instrumentation, for_notebook=for_notebook)
+            if self.layout_cache:
+                self.layout_cache.put(layout_hash, pos, label_pos, node_colors)
+        
+        if self.compact:
+            # Move the results into the arrays so that the dictionaries can be freed
+            compact_graph = self.get_compact_graph(for_notebook)
+            compact_graph.set_positions(pos, label_pos)
+            pos = compact_graph.positions_view()
+            label_pos = compact_graph.label_positions_view()
+        self._lazy_values.setdefault(prefix + 'pos', pos)
+        self._lazy_values.setdefault(prefix + 'label_pos', label_pos)
+    
+    def build_graph(self, for_notebook=False):
+        prefix = 'notebook_' if for_notebook else ''
         # Create a directed graph
         G = nx.DiGraph()
         
         # Define nodes and edges
-        node_items = self.json_nodes
         if for_notebook:
             node_items = self.json_notebook_nodes
+        else:
+            node_items = self.json_nodes
         
         nodes = [node['name'] for node in node_items]
         edges = []
@@ -469,32 +3057,711 @@ class SwimlaneBuildTool:
                 # Assume that it's an array
                 for target in used_by:
                     edges.append((name, target))
-            
-#         print('NODES:', nodes)
-#         print('EDGES:', edges)
-#         if for_notebook:
-#             print('NB POSITIONS:', self.notebook_pos)
-#         else:
-#             print('POSITIONS:', self.pos)
         
         # Add nodes and  edges to the graph
-        G.add_nodes_from(nodes)
-        G.add_edges_from(edges)
+        with self.instrumentation.stage('graph_build', for_notebook=for_notebook) as record:
+            G.add_nodes_from(nodes)
+            G.add_edges_from(edges)
+            record['node_count'] = G.number_of_nodes()
+            record['edge_count'] = G.number_of_edges()
+        self._lazy_values[prefix + 'graph'] = G
+    
+    # Updates the nodes and the layout after nodes have been added, removed or changed without laying everything out
+    # again.  added and modified are json node dictionaries (with a name) that replace the merged node with the same
+    # name and removed is a list of names.  With no arguments, the documentation directory is reloaded and compared
+    # against the current nodes so that the nodes end up the same as they would be for a new SwimlaneBuildTool.
+    # With keep_positions, the nodes that are still in a valid spot don't move (see update_node_positions).  Otherwise
+    # (or if nothing has been laid out yet) the layout is rebuilt from scratch the next time that it's used.
+    # A graph that has already been built is updated in place.  Returns the (added, removed, modified) changes.
+    def apply_changes(self, added=None, removed=None, modified=None, for_notebook=False, keep_positions=True):
+        nodes_name = 'json_notebook_nodes' if for_notebook else 'json_nodes'
+        old_json_nodes = self.json_notebook_nodes if for_notebook else self.json_nodes
+        if added is None and removed is None and modified is None:
+            return self.refresh(keep_positions=keep_positions)[nodes_name]
+        
+        state = self.get_layout_state(for_notebook)
+        added = list(added or [])
+        removed = list(removed or [])
+        modified = list(modified or [])
+        json_nodes = apply_json_node_changes(old_json_nodes, added, removed, modified)
+        self.invalidate(nodes_name)
+        self.store_nodes(json_nodes, for_notebook=for_notebook)
+        self.update_layout(state, added, removed, modified, for_notebook=for_notebook, keep_positions=keep_positions)
+        return added, removed, modified
+    
+    # Reloads the documentation directory and applies the differences to the merged and notebook nodes (along with
+    # their layouts and graphs) that have already been built.  Returns a dictionary of the (added, removed, modified)
+    # changes keyed by 'json_nodes' and 'json_notebook_nodes'.
+    def refresh(self, keep_positions=True):
+        old_nodes = {}
+        states = {}
+        for nodes_name, for_notebook in (('json_nodes', False), ('json_notebook_nodes', True)):
+            if nodes_name in self._lazy_values:
+                old_nodes[nodes_name] = list(self._lazy_values[nodes_name])
+                states[nodes_name] = self.get_layout_state(for_notebook)
+        
+        self.reload()
+        changes = {}
+        for nodes_name, for_notebook in (('json_nodes', False), ('json_notebook_nodes', True)):
+            if nodes_name not in old_nodes:
+                continue
+            json_nodes = self.json_notebook_nodes if for_notebook else self.json_nodes
+            added, removed, modified = diff_json_nodes(old_nodes[nodes_name], json_nodes)
+            changes[nodes_name] = (added, removed, modified)
+            self.update_layout(states[nodes_name], added, removed, modified, for_notebook=for_notebook, keep_positions=keep_positions)
+        return changes
+    
+    # Copies of the layout values (and the graph) that have been computed so far so that they can be updated
+    def get_layout_state(self, for_notebook=False):
+        prefix = 'notebook_' if for_notebook else ''
+        state = {}
+        for name in ('pos', 'node_colors'):
+            value = self._lazy_values.get(prefix + name)
+            state[name] = dict(value) if value is not None else None
+        state['graph'] = self._lazy_values.get(prefix + 'graph')
+        return state
+    
+    # Updates the layout and graph from get_layout_state once the nodes have changed
+    def update_layout(self, state, added, removed, modified, for_notebook=False, keep_positions=True):
+        prefix = 'notebook_' if for_notebook else ''
+        json_nodes = self.json_notebook_nodes if for_notebook else self.json_nodes
+        node_names = set(node['name'] for node in json_nodes)
+        removed_names = set(removed)
+        
+        if state['graph'] is not None:
+            with self.instrumentation.stage('graph_update', for_notebook=for_notebook) as record:
+                apply_graph_changes(state['graph'], node_names, added, removed, modified)
+                record['node_count'] = state['graph'].number_of_nodes()
+                record['edge_count'] = state['graph'].number_of_edges()
+            self._lazy_values[prefix + 'graph'] = state['graph']
+        
+        if not keep_positions or state['pos'] is None:
+            return
+        
+        pos = {node_name: coords for node_name, coords in state['pos'].items() if node_name in node_names and node_name not in removed_names}
+        changed_names = [node['name'] for node in added] + [node['name'] for node in modified]
+        with self.instrumentation.stage('incremental_placement', for_notebook=for_notebook) as record:
+            pos, max_width, max_height = update_node_positions(pos, json_nodes, changed_names, removed_names=removed, stats=record)
+            record['node_count'] = len(pos)
+        label_pos = calculate_label_positions(pos, max_width, max_height)
+        
+        if self.compact:
+            compact_graph = self.get_compact_graph(for_notebook)
+            compact_graph.set_positions(pos, label_pos)
+            pos = compact_graph.positions_view()
+            label_pos = compact_graph.label_positions_view()
+            node_colors = compact_graph.colors_view()
+        elif state['node_colors'] is not None:
+            # Keep any colors that were set, just update the ones for the nodes that changed
+            node_colors = {node_name: color for node_name, color in state['node_colors'].items() if node_name in node_names and node_name not in removed_names}
+            node_colors.update(set_colors_and_initial_node_positions(added + modified)[1])
+        else:
+            node_colors = set_colors_and_initial_node_positions(json_nodes)[1]
+        self._lazy_values[prefix + 'pos'] = pos
+        self._lazy_values[prefix + 'label_pos'] = label_pos
+        self._lazy_values[prefix + 'node_colors'] = node_colors
+    
+    # Polls the documentation directory and keeps everything up to date (see SwimlaneDirectoryWatcher).  Files are
+    # tracked in an in-memory build cache when use_cache is off so that only the changed files are read again.
+    def watch(self, interval=2.0, debounce=1.0, callbacks=None, keep_positions=True, start=True):
+        if self.build_cache is None:
+            self.build_cache = SwimlaneBuildCache(self.documentation_dir, persistent=False)
+            if self.store is not None:
+                self.build_cache.refresh_from_store(self.store, self.store.get_file_names())
+            else:
+                self.build_cache.refresh(get_swimlane_file_names(self.documentation_dir), max_workers=self.load_workers, use_processes=self.use_processes)
+        watcher = SwimlaneDirectoryWatcher(self, interval=interval, debounce=debounce, callbacks=callbacks, keep_positions=keep_positions)
+        if start:
+            watcher.start()
+        return watcher
+    
+    # Built once for the merged (or notebook) nodes and kept until they change (see SwimlaneReachabilityIndex)
+    def get_reachability_index(self, for_notebook=False):
+        prefix = 'notebook_' if for_notebook else ''
+        if prefix + 'reachability_index' not in self._lazy_values:
+            json_nodes = self.json_notebook_nodes if for_notebook else self.json_nodes
+            with self.instrumentation.stage('reachability_index', for_notebook=for_notebook) as record:
+                reachability_index = SwimlaneReachabilityIndex(json_nodes)
+                record['node_count'] = len(reachability_index.order)
+                record['has_bitsets'] = reachability_index.has_bitsets
+                record['bitset_bytes'] = reachability_index.bitset_bytes
+            self._lazy_values[prefix + 'reachability_index'] = reachability_index
+        return self._lazy_values[prefix + 'reachability_index']
+    
+    # What feeds node_name.  max_depth limits how many steps back to go (1 is just the nodes in its used_by lists) and
+    # freq (a value or a list of them) only returns the nodes with those freq values.  The nodes come back in lineage order.
+    def get_upstream(self, node_name, max_depth=None, freq=None, for_notebook=False):
+        return self.get_reachability_index(for_notebook).get_upstream(node_name, max_depth=max_depth, freq=freq)
+    
+    # What node_name feeds (what breaks if it changes).  Same options as get_upstream.
+    def get_downstream(self, node_name, max_depth=None, freq=None, for_notebook=False):
+        return self.get_reachability_index(for_notebook).get_downstream(node_name, max_depth=max_depth, freq=freq)
+    
+    # Does node_name feed other_name
+    def is_upstream(self, node_name, other_name, for_notebook=False):
+        return self.get_reachability_index(for_notebook).is_upstream(node_name, other_name)
+    
+    # Lays out just the lineage of node_name.  Returns a dictionary with the lineage's json_nodes, graph, pos, label_pos and
+    # node_colors that can be drawn like the full graph.
+    def get_lineage_layout(self, node_name, direction='both', max_depth=None, freq=None, for_notebook=False):
+        lineage_json_nodes = self.get_reachability_index(for_notebook).get_lineage_json_nodes(node_name, direction=direction, max_depth=max_depth, freq=freq)
+        initial_pos, node_colors = set_colors_and_initial_node_positions(lineage_json_nodes)
+        pos, label_pos = set_final_node_and_label_positions(initial_pos, lineage_json_nodes, resolve_edge_collisions=self.resolve_edge_collisions)
+        graph = nx.DiGraph()
+        graph.add_nodes_from(node['name'] for node in lineage_json_nodes)
+        graph.add_edges_from((node['name'], used_by_name) for node in lineage_json_nodes for used_by_name in node['used_by'])
+        return {'json_nodes': lineage_json_nodes, 'graph': graph, 'pos': pos, 'label_pos': label_pos, 'node_colors': node_colors}
+    
+    # Draws the merged (or notebook) swimlanes much faster than nx.draw.  See render_swimlane for the options.
+    #     sbt.render(file_name='swimlanes.png')
+    #     sbt.render(ax=ax, connectionstyle='arc3, rad=0.1', cull_labels=True)
+    def render(self, for_notebook=False, ax=None, file_name=None, **options):
+        if for_notebook:
+            json_nodes, pos, label_pos, node_colors = self.json_notebook_nodes, self.notebook_pos, self.notebook_label_pos, self.notebook_node_colors
+        else:
+            json_nodes, pos, label_pos, node_colors = self.json_nodes, self.pos, self.label_pos, self.node_colors
+        with self.instrumentation.stage('render', for_notebook=for_notebook) as record:
+            return render_swimlane(json_nodes, pos, label_pos, node_colors, ax=ax, file_name=file_name, stats=record, **options)
+    
+    # When each node last ran according to the run journals in journal_dir (documentation_dir/.journal by default) as
+    # node name -> datetime.  A node ran whenever a notebook that documents it logged something with load_and_document
+    # or a message named it.  For the notebook nodes, it's when the notebook last logged something.
+    # Nodes that have never run are left out.
+    def get_last_run_times(self, for_notebook=False, journal_dir=None):
+        if journal_dir is None:
+            journal_dir = os.path.join(self.documentation_dir, '.journal')
+        json_nodes = self.json_notebook_nodes if for_notebook else self.json_nodes
+        with self.instrumentation.stage('journal', for_notebook=for_notebook) as record:
+            last_runs = read_run_journals(journal_dir, stats=record)
+        file_times = {file_name: file_record['time'] for file_name, file_record in last_runs['files'].items()}
+        
+        node_names = set(node['name'] for node in json_nodes)
+        last_run_times = {}
+        if for_notebook:
+            for node_name in node_names:
+                if node_name in file_times:
+                    last_run_times[node_name] = file_times[node_name]
+        else:
+            build_files = self._lazy_values.get('build_files', [])
+            file_summaries = self.get_file_summaries(build_files) if 'loaded_files' in self._lazy_values else []
+            for file_name, file_summary in file_summaries:
+                run_time = file_times.get(file_name.replace('.json', ''))
+                if run_time is None:
+                    continue
+                for node_name in file_summary['node_names']:
+                    if node_name in node_names and last_run_times.get(node_name, '') < run_time:
+                        last_run_times[node_name] = run_time
+            for node_name, node_record in last_runs['nodes'].items():
+                if node_name in node_names and last_run_times.get(node_name, '') < node_record['time']:
+                    last_run_times[node_name] = node_record['time']
+        return {node_name: datetime.fromisoformat(run_time) for node_name, run_time in last_run_times.items()}
+    
+    # Returns the timings and counts of the stages that have run so far (optionally just one stage like 'placement').
+    # Each record has the stage name, for_notebook where it applies, seconds and counts such as node_count,
+    # edge_count, file_count, free_row_steps and row_conflict_iterations.
+    def get_stage_stats(self, stage=None):
+        return self.instrumentation.get_records(stage)
+    
+    # Returns the count, total seconds and max seconds of every stage (or just one) since the tool was created.
+    # Unlike get_stage_stats, these don't drop the older runs.
+    def get_stage_totals(self, stage=None):
+        return self.instrumentation.get_totals(stage)
+    
+    # callback(event, record) is called with event 'start' and 'end' around every stage
+    def add_stage_callback(self, callback):
+        self.instrumentation.add_callback(callback)
+    
+    @property
+    def load_errors(self):
+        return self.get_lazy_value('load_errors', self.load_files)
+    
+    # Values that differed between the files that describe the same node (see merge_node_definitions)
+    @property
+    def merge_conflicts(self):
+        if 'merge_conflicts' not in self._lazy_values and 'json_nodes' in self._lazy_values:
+            # The nodes were set directly, so merge the files again just for the conflicts (if any were loaded)
+            if 'loaded_files' not in self._lazy_values:
+                return []
+            build_files = self._lazy_values['build_files']
+            merge_conflicts = []
+            if self.build_cache:
+                self.build_cache.build_json_nodes(build_files, merge_conflicts)
+            else:
+                merge_swimlane_nodes(self.get_loaded_files(build_files), merge_conflicts)
+            self._lazy_values['merge_conflicts'] = merge_conflicts
+        return self.get_lazy_value('merge_conflicts', self.build_nodes)
+    
+    @property
+    def json_nodes(self):
+        return self.get_lazy_value('json_nodes', self.build_nodes)
+    
+    @json_nodes.setter
+    def json_nodes(self, value):
+        self.set_lazy_value('json_nodes', value)
+    
+    @property
+    def json_notebook_nodes(self):
+        return self.get_lazy_value('json_notebook_nodes', self.build_notebook_nodes)
+    
+    @json_notebook_nodes.setter
+    def json_notebook_nodes(self, value):
+        self.set_lazy_value('json_notebook_nodes', value)
+    
+    @property
+    def pos(self):
+        return self.get_lazy_value('pos', self.build_layout)
+    
+    @pos.setter
+    def pos(self, value):
+        self.set_lazy_value('pos', value)
+    
+    @property
+    def label_pos(self):
+        return self.get_lazy_value('label_pos', self.build_layout)
+    
+    @label_pos.setter
+    def label_pos(self, value):
+        self.set_lazy_value('label_pos', value)
+    
+    @property
+    def node_colors(self):
+        return self.get_lazy_value('node_colors', self.build_colors)
+    
+    @node_colors.setter
+    def node_colors(self, value):
+        self.set_lazy_value('node_colors', value)
+    
+    @property
+    def notebook_pos(self):
+        return self.get_lazy_value('notebook_pos', lambda: self.build_layout(for_notebook=True))
+    
+    @notebook_pos.setter
+    def notebook_pos(self, value):
+        self.set_lazy_value('notebook_pos', value)
+    
+    @property
+    def notebook_label_pos(self):
+        return self.get_lazy_value('notebook_label_pos', lambda: self.build_layout(for_notebook=True))
+    
+    @notebook_label_pos.setter
+    def notebook_label_pos(self, value):
+        self.set_lazy_value('notebook_label_pos', value)
+    
+    @property
+    def notebook_node_colors(self):
+        return self.get_lazy_value('notebook_node_colors', lambda: self.build_colors(for_notebook=True))
+    
+    @notebook_node_colors.setter
+    def notebook_node_colors(self, value):
+        self.set_lazy_value('notebook_node_colors', value)
+    
+    def get_compact_graph(self, for_notebook=False):
+        return self.notebook_compact_graph if for_notebook else self.compact_graph
+    
+    # Array backed versions of the merged and notebook nodes (see SwimlaneCompactGraph)
+    @property
+    def compact_graph(self):
+        return self.get_lazy_value('compact_graph', self.build_compact_graph)
+    
+    @property
+    def notebook_compact_graph(self):
+        return self.get_lazy_value('notebook_compact_graph', lambda: self.build_compact_graph(for_notebook=True))
+    
+    # Shared DiGraphs of the merged and notebook nodes.  Use get_initialized_DiGraph for a graph that can be changed.
+    @property
+    def graph(self):
+        return self.get_lazy_value('graph', self.build_graph)
+    
+    @property
+    def notebook_graph(self):
+        return self.get_lazy_value('notebook_graph', lambda: self.build_graph(for_notebook=True))
+    
+    # The edges of the merged (or notebook) nodes as NumPy arrays (see get_edge_arrays).  They're kept until the nodes
+    # change and handed to every caller, so the arrays are read only.
+    def get_edge_arrays(self, for_notebook=False):
+        prefix = 'notebook_' if for_notebook else ''
+        return self.get_lazy_value(prefix + 'edge_arrays', lambda: self.build_edge_arrays(for_notebook))
+    
+    def build_edge_arrays(self, for_notebook=False):
+        prefix = 'notebook_' if for_notebook else ''
+        json_nodes = self.json_notebook_nodes if for_notebook else self.json_nodes
+        with self.instrumentation.stage('edge_arrays', for_notebook=for_notebook) as record:
+            node_names, sources, targets = get_edge_arrays(json_nodes)
+            sources.flags.writeable = False
+            targets.flags.writeable = False
+            record['node_count'] = len(node_names)
+            record['edge_count'] = len(sources)
+        self._lazy_values[prefix + 'edge_arrays'] = (tuple(node_names), sources, targets)
+    
+    # Returns (node_names, matrix) with a new SciPy sparse adjacency matrix of the merged (or notebook) nodes
+    # (see build_sparse_adjacency)
+    def get_sparse_adjacency(self, for_notebook=False, format='csr', dtype='int64'):
+        node_names, sources, targets = self.get_edge_arrays(for_notebook)
+        return node_names, build_sparse_adjacency(node_names, sources, targets, format=format, dtype=dtype)
+    
+    def get_initialized_notebook_DiGraph(self, copy=True):
+        return self.get_initialized_DiGraph(for_notebook=True, copy=copy)
+    
+    # Returns a new DiGraph that can be changed.  It's copied from the shared graph (see the graph property) by adding
+    # the nodes and edges again, which is a little faster than graph.copy() but still costs about as much as building
+    # the graph (around 0.05s for 10000 nodes and 0.5s for 50000).  Code that only reads the graph should use the graph
+    # property or copy=False, which returns a read only view of the shared graph without copying anything.
+    def get_initialized_DiGraph(self, for_notebook=False, copy=True):
+        graph = self.notebook_graph if for_notebook else self.graph
+        if not copy:
+            return graph.copy(as_view=True)
+        G = nx.DiGraph()
+        G.add_nodes_from(graph)
+        G.add_edges_from(graph.edges)
         return G
     
+# Keeps a SwimlaneBuildTool up to date with its documentation directory without anything outside of Python.
+# Each poll is one scandir of the directory with the mtime and size of every swimlane file compared against the last
+# poll.  Once the files have stopped changing for debounce seconds (so a burst of save_file calls is picked up at
+# once), SwimlaneBuildTool.refresh re-reads the changed files and updates the merged nodes, layout and graph in place.
+# Each callback is called as callback(changes) with the changes that refresh returns.  The updates happen on the
+# watcher's thread, so hold the lock while reading from the build tool on another thread.
+class SwimlaneDirectoryWatcher:
+    
+    def __init__(self, build_tool, interval=2.0, debounce=1.0, callbacks=None, keep_positions=True):
+        self.build_tool = build_tool
+        self.interval = interval
+        self.debounce = debounce
+        self.keep_positions = keep_positions
+        self.callbacks = list(callbacks) if callbacks else []
+        self.lock = threading.RLock()
+        self.snapshot = self.take_snapshot()
+        # When the last change that hasn't been applied yet was seen
+        self.pending_since = None
+        self.thread = None
+        self.stop_event = threading.Event()
+    
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+    
+    # file name -> (mtime_ns, size) for every swimlane file in the documentation directory.  With a store, the
+    # store's generation stands in for the whole directory.
+    def take_snapshot(self):
+        if self.build_tool.store is not None:
+            return {'generation': self.build_tool.store.get_generation()}
+        snapshot = {}
+        try:
+            with os.scandir(self.build_tool.documentation_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.json') and entry.is_file():
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            pass
+        return snapshot
+    
+    # Checks the directory once.  Returns the changes if they were applied and None otherwise.
+    def poll(self):
+        now = time.monotonic()
+        snapshot = self.take_snapshot()
+        if snapshot != self.snapshot:
+            # Still changing, so wait for it to settle
+            self.snapshot = snapshot
+            self.pending_since = now
+            return None
+        if self.pending_since is None or now - self.pending_since < self.debounce:
+            return None
+        self.pending_since = None
+        return self.apply()
+    
+    def apply(self):
+        with self.lock:
+            changes = self.build_tool.refresh(keep_positions=self.keep_positions)
+        if any(added or removed or modified for (added, removed, modified) in changes.values()):
+            for callback in self.callbacks:
+                callback(changes)
+        return changes
+    
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                # Keep watching.  The next change will try again.
+                logger.exception('Could not update from %s', self.build_tool.documentation_dir)
+    
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='SwimlaneDirectoryWatcher', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+# The journal is written out once this many bytes are waiting or after flush_interval seconds
+default_journal_flush_bytes = 64 * 1024
+default_journal_flush_interval = 1.0
+# Journals are rotated to name.1, name.2, ... once they reach max_bytes.  The oldest one is compacted into the
+# summary instead of being deleted so that the last runs aren't lost.
+default_journal_max_bytes = 8 * 1024 * 1024
+default_journal_backup_count = 3
+# If the journal can't be written, at most this many flush_bytes are held on to for the next try
+max_journal_buffer_flushes = 16
+
+# Appends json lines to a journal file without making the caller wait for the disk.  write() only adds the line to a
+# buffer and a background thread writes the buffer out when it's big enough, every flush_interval seconds and when
+# the journal is closed (which happens at exit).  Each journal file should only be written by one process.
+class SwimlaneRunJournal:
+    
+    def __init__(self, journal_file_name, flush_bytes=default_journal_flush_bytes, flush_interval=default_journal_flush_interval,
+                 max_bytes=default_journal_max_bytes, backup_count=default_journal_backup_count):
+        self.journal_file_name = journal_file_name
+        self.summary_file_name = journal_file_name + '.summary.json'
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer = []
+        self.buffer_bytes = 0
+        # lock guards the buffer and is only held long enough to add to it or swap it out.  flush_lock keeps the
+        # writer thread and explicit flushes from writing at the same time.
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.closed = False
+        atexit.register(self.close)
+    
+    def write(self, record):
+        line = json.dumps(record) + '\n'
+        with self.lock:
+            self.buffer.append(line)
+            self.buffer_bytes += len(line)
+            is_full = self.buffer_bytes >= self.flush_bytes
+            if self.thread is None and not self.closed:
+                self.thread = threading.Thread(target=self.run, name='SwimlaneRunJournal', daemon=True)
+                self.thread.start()
+        if self.closed:
+            # Nothing is left to write it in the background
+            self.flush()
+        elif is_full:
+            self.wake_event.set()
+    
+    def run(self):
+        while not self.stop_event.is_set():
+            self.wake_event.wait(self.flush_interval)
+            self.wake_event.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Keep going.  The lines are kept for the next flush.
+                logger.exception('Could not write to the %s journal', self.journal_file_name)
+    
+    # Writes everything in the buffer out now
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                lines = self.buffer
+                self.buffer = []
+                self.buffer_bytes = 0
+            if not lines:
+                return
+            content = ''.join(lines)
+            try:
+                journal_dir = os.path.dirname(self.journal_file_name)
+                if journal_dir:
+                    os.makedirs(journal_dir, exist_ok=True)
+                with open(self.journal_file_name, 'a', encoding='utf-8') as file:
+                    file.write(content)
+                    size = file.tell()
+            except BaseException:
+                with self.lock:
+                    if self.buffer_bytes + len(content) <= self.flush_bytes * max_journal_buffer_flushes:
+                        self.buffer[:0] = lines
+                        self.buffer_bytes += len(content)
+                    else:
+                        logger.warning('Dropped %d lines that could not be written to the %s journal', len(lines), self.journal_file_name)
+                raise
+            if self.max_bytes and size >= self.max_bytes:
+                self.rotate()
+    
+    def get_backup_file_name(self, index):
+        return self.journal_file_name + '.' + str(index)
+    
+    def rotate(self):
+        if self.backup_count <= 0:
+            self.compact(self.journal_file_name)
+            os.remove(self.journal_file_name)
+            return
+        oldest_file_name = self.get_backup_file_name(self.backup_count)
+        if os.path.exists(oldest_file_name):
+            self.compact(oldest_file_name)
+            os.remove(oldest_file_name)
+        for index in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(self.get_backup_file_name(index)):
+                os.replace(self.get_backup_file_name(index), self.get_backup_file_name(index + 1))
+        os.replace(self.journal_file_name, self.get_backup_file_name(1))
+    
+    # Folds the last runs from a journal file into the summary file
+    def compact(self, file_name):
+        last_runs = read_journal_summary(self.summary_file_name)
+        read_journal_file(file_name, last_runs)
+        temp_file_name = self.summary_file_name + '.' + str(os.getpid()) + '.tmp'
+        try:
+            with open(temp_file_name, 'w', encoding='utf-8') as file:
+                json.dump(last_runs, file)
+            os.replace(temp_file_name, self.summary_file_name)
+        except BaseException:
+            if os.path.exists(temp_file_name):
+                os.remove(temp_file_name)
+            raise
+    
+    # Stops the writer thread and writes out anything that's left.  Anything written afterwards is written right away.
+    def close(self):
+        with self.lock:
+            self.closed = True
+            thread = self.thread
+        if thread is not None:
+            self.stop_event.set()
+            self.wake_event.set()
+            thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+# One journal per file so that every SwimlaneDocumentation for a notebook shares the same buffer and writer
+run_journals = {}
+run_journals_lock = threading.Lock()
+
+def get_run_journal(journal_file_name):
+    journal_file_name = os.path.abspath(journal_file_name)
+    with run_journals_lock:
+        journal = run_journals.get(journal_file_name)
+        if journal is None:
+            journal = run_journals[journal_file_name] = SwimlaneRunJournal(journal_file_name)
+        return journal
+
+# Keeps the latest record for each file and for each node named in the record.  last_runs is a dictionary with
+# 'files' (swimlane file name -> record) and 'nodes' (node name -> record).
+def update_last_runs(last_runs, record):
+    run_time = record.get('time')
+    if not run_time:
+        return
+    file_name = record.get('file')
+    if file_name:
+        last_record = last_runs['files'].get(file_name)
+        if last_record is None or last_record['time'] <= run_time:
+            last_runs['files'][file_name] = record
+    node_names = record.get('nodes')
+    if node_names:
+        # The node records don't need the list of nodes again
+        node_record = {key: value for key, value in record.items() if key != 'nodes'}
+        for node_name in node_names:
+            last_record = last_runs['nodes'].get(node_name)
+            if last_record is None or last_record['time'] <= run_time:
+                last_runs['nodes'][node_name] = node_record
+
+# Adds the last runs in other_last_runs to last_runs
+def merge_last_runs(last_runs, other_last_runs):
+    for kind in ('files', 'nodes'):
+        records = last_runs[kind]
+        for name, record in other_last_runs[kind].items():
+            last_record = records.get(name)
+            if last_record is None or last_record['time'] <= record['time']:
+                records[name] = record
+
+def read_journal_summary(summary_file_name):
+    try:
+        with open(summary_file_name, 'rb') as file:
+            last_runs = parse_json(file.read())
+    except FileNotFoundError:
+        return {'files': {}, 'nodes': {}}
+    except ValueError as e:
+        logger.warning('Ignoring the %s journal summary because it could not be parsed: %s', summary_file_name, e)
+        return {'files': {}, 'nodes': {}}
+    last_runs.setdefault('files', {})
+    last_runs.setdefault('nodes', {})
+    return last_runs
+
+# Adds the records in a journal file to last_runs.  Returns the number of records that were read.  Lines that can't
+# be parsed (like one that was cut off by a crash) are skipped.
+def read_journal_file(file_name, last_runs):
+    record_count = 0
+    with open(file_name, 'rb') as file:
+        for line in file:
+            try:
+                record = parse_json(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                update_last_runs(last_runs, record)
+                record_count += 1
+    return record_count
+
+# Reads every journal (along with the rotated and compacted ones) in journal_dir.  Returns the last run records as
+# {'files': {swimlane file name: record}, 'nodes': {node name: record}}.
+def read_run_journals(journal_dir, stats=None):
+    last_runs = {'files': {}, 'nodes': {}}
+    file_count = 0
+    record_count = 0
+    try:
+        with os.scandir(journal_dir) as entries:
+            file_names = sorted(entry.path for entry in entries if entry.is_file() and '.jsonl' in entry.name and not entry.name.endswith('.tmp'))
+    except FileNotFoundError:
+        file_names = []
+    for file_name in file_names:
+        file_count += 1
+        if file_name.endswith('.summary.json'):
+            merge_last_runs(last_runs, read_journal_summary(file_name))
+        else:
+            try:
+                record_count += read_journal_file(file_name, last_runs)
+            except FileNotFoundError:
+                # Rotated while it was being read
+                continue
+    if stats is not None:
+        stats['file_count'] = file_count
+        stats['record_count'] = record_count
+    return last_runs
+
 class SwimlaneDocumentation:
-    def __init__(self, swimlane_file_name, notebook_name, documentation_dir=default_swimlane_directory, used_by=[], freq=None, user_name=None):
+    def __init__(self, swimlane_file_name, notebook_name, documentation_dir=default_swimlane_directory, used_by=[], freq=None, user_name=None, store=None,
+                 journal_dir=None):
         self.user_name = user_name
         self.documentation_dir = documentation_dir
         self.swimlane_file_name = swimlane_file_name.replace(' ', '_')
+        # load_and_document writes to swimlane_file_name.jsonl in journal_dir (documentation_dir/.journal by default)
+        self.journal_dir = journal_dir if journal_dir else os.path.join(documentation_dir, '.journal')
+        self.journal = None
+        # With a store (a SwimlaneDocumentStore or the path to its database), the file is saved there instead of
+        # in the documentation directory.  A store that's opened from a path is closed by close().
+        self.owns_store = isinstance(store, str)
+        if self.owns_store:
+            store = SwimlaneDocumentStore(store)
+        self.store = store
         
         self.json_data = {}
         # Not sure if I'll need this variable but the method is definitely used elsewhere.
-        self.existing_json_data = load_swimlane_file(self.swimlane_file_name, self.documentation_dir)
+        if self.store is not None:
+            self.existing_json_data = self.store.load(self.swimlane_file_name + '.json') or {}
+        else:
+            self.existing_json_data = load_swimlane_file(self.swimlane_file_name, self.documentation_dir)
 #         print('existing_json_data:', self.existing_json_data)
         
         # Make sure that the documentation directory exists
-        os.makedirs(self.documentation_dir, exist_ok=True)
+        if self.store is None:
+            os.makedirs(self.documentation_dir, exist_ok=True)
         
         # Make sure that its always an array of strings
         if isinstance(used_by, str):
@@ -510,16 +3777,61 @@ class SwimlaneDocumentation:
         
         self.json_data['swimlane_nodes'] = {}
         
+        # Used by batch() to defer saving until the end of the batch
+        self.batch_depth = 0
+        self.batch_is_dirty = False
+        
         self.save_file()
         
 #         print('SwimlaneDocumentation notebook_name', self.notebook_name)
 #         print('SwimlaneDocumentation cwd', os.getcwd())
         
     def save_file(self):
+        # Inside of a batch, just remember that it needs to be saved at the end
+        if self.batch_depth > 0:
+            self.batch_is_dirty = True
+            return
         # This just needs to save the file in its current state
-        json_file_name = os.path.join(self.documentation_dir, self.swimlane_file_name.replace(' ', '_') + '.json')
-        with open(json_file_name, 'w') as file:
-            json.dump(self.json_data, file, indent=4)
+        if self.store is not None:
+            self.store.save(self.swimlane_file_name + '.json', self.json_data)
+        else:
+            write_swimlane_file(os.path.join(self.documentation_dir, self.swimlane_file_name + '.json'), self.json_data)
+        self.batch_is_dirty = False
+    
+    # Defers saving until the end of the block so that the file is only written once:
+    #     with doc.batch():
+    #         doc.add_node(...)
+    #         doc.add_node(...)
+    # If anything in the block fails, the nodes are rolled back to where they were before the batch and nothing is written.
+    # Batches can be nested and only the outermost one saves.
+    @contextmanager
+    def batch(self):
+        if self.batch_depth == 0:
+            snapshot = copy.deepcopy(self.json_data)
+        self.batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.batch_depth -= 1
+            if self.batch_depth == 0:
+                self.json_data = snapshot
+                self.batch_is_dirty = False
+            raise
+        self.batch_depth -= 1
+        if self.batch_depth == 0 and self.batch_is_dirty:
+            self.save_file()
+    
+    # Adds several nodes with a single save.  Each item can be a node name, a tuple of add_node arguments
+    # or a dictionary of add_node keyword arguments such as {'name': 'output.csv', 'used_by': ['Final Vis']}
+    def add_nodes(self, nodes):
+        with self.batch():
+            for node in nodes:
+                if isinstance(node, str):
+                    self.add_node(node)
+                elif isinstance(node, dict):
+                    self.add_node(**node)
+                else:
+                    self.add_node(*node)
         
     def add_node(self, name, used_by=None, marker='o', freq='u', notes=None):
         # Get the node's dictionary if it already exists.  Otherwise, default to an empty dictionare
@@ -547,19 +3859,48 @@ class SwimlaneDocumentation:
         self.json_data['swimlane_nodes'][name] = node_dict
         self.save_file()
         
-      # Not complete yet...
-#     def load_and_document(self, message, print_to_console=False):
-#         timestamp = datetime.now.strftime("%Y-%m-%d %H:%M:%S")
-#         if self.user_name:
-#             log_entry = f"{self.user_name} {timestamp}: {message}"
-#         else:
-#             log_entry = f"{timestamp}: {message}"
+    # Records a message in this notebook's run journal (see SwimlaneRunJournal) along with when it ran.  nodes can name
+    # the nodes that the message is about so that SwimlaneBuildTool.get_last_run_times can tell exactly when they ran.
+    # The journal is written in the background so this is safe to call for every record in a loop.
+    def load_and_document(self, message, print_to_console=False, nodes=None):
+        now = datetime.now()
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        if self.user_name:
+            log_entry = f"{self.user_name} {timestamp}: {message}"
+        else:
+            log_entry = f"{timestamp}: {message}"
         
-#         if print_to_console:
-#             print(log_entry)
+        if print_to_console:
+            print(log_entry)
         
-#         with open(self.log_file_name, "a") as log_file:
-#             log_file.write(log_entry + "\n")
+        record = {'time': now.isoformat(), 'file': self.swimlane_file_name, 'message': message}
+        if self.user_name:
+            record['user'] = self.user_name
+        if nodes:
+            record['nodes'] = [nodes] if isinstance(nodes, str) else list(nodes)
+        self.get_journal().write(record)
+    
+    def get_journal(self):
+        if self.journal is None:
+            self.journal = get_run_journal(os.path.join(self.journal_dir, self.swimlane_file_name + '.jsonl'))
+        return self.journal
+    
+    # Writes out anything that's waiting in the run journal now instead of in the background
+    def flush_journal(self):
+        if self.journal is not None:
+            self.journal.flush()
+    
+    # Writes out the run journal and closes the store if it was opened from a path
+    def close(self):
+        self.flush_journal()
+        if self.owns_store and self.store is not None:
+            self.store.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
         
         
         